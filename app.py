@@ -2,9 +2,15 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import date
 import numpy as np
-from is_clickbait import is_clickbait
+import os
+from is_clickbait import criterion_stats, is_clickbait
+from panel_data import PanelDataset, dataset_version, wilson_interval
+from panel_store import STORE_MANIFEST, PartitionedDataset, store_version
+from title_index import TitleIndex, month_range, title_store_version
+from figure_cache import cached_figure
+import profiling
+from profiling import stage, timed
 
 # 全域變數測試
 # 因為會需要用到map，所以直接打出媒體，而非每次計算
@@ -19,6 +25,9 @@ bait_options = ['forward-referencing','emotional','interrogative','surprise','el
 bait_colors = media_colors + ['#D94DFF', '#FFDAB9']
 bait_color_map = dict(zip(bait_options, bait_colors))
 alpha = 0.4 #移動平均最新資料的權重
+raw_page_rows = 1000 # 「顯示篩選後的數據」每頁的列數
+# 長期分析圖表使用的媒體 (與圖表函式中的 From2018 相同)
+long_term_media = ['ETToday', '今日新聞', 'Storm Media', 'NewYorkTimes', 'NewsLens', 'TVBS', '報導者']
 criteria_list = [
         "前項指涉：(代名詞)'他', '他們', '你', '這'…",
         "問題式：'?!', '!', '?'",
@@ -42,74 +51,136 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-@st.cache_data
+# 所有 session 共用同一份唯讀資料 (cache_resource 不會每次 rerun 都複製)，資料檔更新時以新版本重新載入
+@st.cache_resource(max_entries=4)
+def LoadDataset(file, version):
+    return PanelDataset(file)
+
 def GetProcessedData(file):
-    df = pd.read_csv(file)
-    try:
-        del df['Unnamed: 0']
-        # Convert 'Date' column to datetime
-        df['Date'] = pd.to_datetime(df['Date']).dt.date
-        df = df[df['Date'] > date(2017,12,31)]
-        df.sort_values(by='Date', inplace=True)
-    except:
-        pass
-    return df
+    return LoadDataset(file, dataset_version(file))
+
+# 多年、每日的資料改用依 (月份, 媒體) 分割的 parquet (pipeline.py --panel-dir 產生)，查詢時只讀取篩選到的分割
+@st.cache_resource(max_entries=4)
+def LoadPartitionedData(root, version):
+    return PartitionedDataset(root)
+
+def GetPartitionedData(root):
+    # 資料夾中沒有分割的 panel 時回傳 None
+    version = store_version(root)
+    return None if version is None else LoadPartitionedData(root, version)
 
 # select date here
-@st.cache_data
-def SelectDate(df, start_date, end_date):
-    return df[(df['Date'] >= start_date) & (df['Date'] <= end_date)]
+# 以資料版本、日期與頁數當作 cache key，不需要 hash 整個 DataFrame；每頁最多 raw_page_rows 列，快取的大小有上限
+@st.cache_resource(max_entries=64)
+def SelectDate(_dataset, version, start_date, end_date, page=0):
+    return _dataset.select_date(start_date, end_date, page * raw_page_rows, raw_page_rows)
+
+@st.cache_resource(max_entries=64)
+def CountRows(_dataset, version, start_date, end_date):
+    return _dataset.count_rows(start_date, end_date)
+
+# 標題查詢用的 posting list 索引，所有 session 共用；第一次查詢時才載入
+@st.cache_resource(max_entries=2)
+def LoadTitleIndex(out_dir, version):
+    return TitleIndex(out_dir)
+
+def GetTitleIndex(out_dir='.'):
+    # 沒有標題資料 (pipeline.py 以 --dedup global/press 產生) 時回傳 None
+    version = title_store_version(out_dir)
+    return None if version is None else LoadTitleIndex(out_dir, version)
 
 # Load the data
-three_moth_df = GetProcessedData("panel_data_three_month.csv")
-df = GetProcessedData("panel_data_weekly.csv")
+profiling.begin_run()
+with stage('GetProcessedData'):
+    three_moth_cube = GetProcessedData("panel_data_three_month.csv").cube
+    panel_dir = os.environ.get('CLICKBAIT_PANEL_DIR')
+    dataset = GetPartitionedData(panel_dir) if panel_dir else GetProcessedData("panel_data_weekly.csv")
+if dataset is None:
+    st.error(f'CLICKBAIT_PANEL_DIR ({panel_dir}) 中沒有分割的 panel (找不到 {STORE_MANIFEST})：'
+             f'請以 `python pipeline.py build <原始標題檔> --panel-dir {panel_dir}` 產生，或取消這個環境變數')
+    st.stop()
+cube = dataset.cube
+
+# 側邊欄的預設值
+default_start_date = dataset.start_date.date()
+default_end_date = dataset.end_date.date()
+default_media = dataset.presses
+default_categories = dataset.categories
+
+# 比例的 95% 信賴區間：對彙總後的每一列一次算完 (Wilson interval)，不需逐組計算
+def AddInterval(df, successes, trials, lower='Lower', upper='Upper'):
+    df[lower], df[upper] = wilson_interval(df[successes], df[trials])
+
+def ErrorBars(df, successes, trials, ratio):
+    # 轉成 px.bar 的 error bar 欄位
+    AddInterval(df, successes, trials)
+    df['ErrorPlus'] = df['Upper'] - df[ratio]
+    df['ErrorMinus'] = df[ratio] - df['Lower']
+    return {'error_y': 'ErrorPlus', 'error_y_minus': 'ErrorMinus'}
+
+def AddIntervalBands(fig, df, group, x='MonthYear', lower='Lower', upper='Upper'):
+    # 在每條線加上同色的半透明信賴區間色帶 (上界接著反向的下界圍成一塊)
+    bands = {name: part.dropna(subset=[lower, upper]) for name, part in df.groupby(group, observed=True)}
+    for trace in list(fig.data):
+        band = bands.get(trace.name)
+        if band is None or band.empty:
+            continue
+        fig.add_trace(go.Scatter(x=[*band[x], *band[x][::-1]], y=[*band[upper], *band[lower][::-1]], name=trace.name,
+                                 fill='toself', fillcolor=trace.line.color, opacity=0.2, line_width=0,
+                                 hoverinfo='skip', showlegend=False))
 
 #pingju's
-def  media_count(df,selected_Categories,selected_Media):
-    df_filtered = df[df['Press'].isin(selected_Media)]
-    df_filtered = df_filtered[df_filtered['Category'].isin(selected_Categories)]
+# 圖表函式只依參數產生 figure，並以 (圖表, 資料版本, 篩選條件) 快取
+@timed
+@cached_figure
+def  media_count(cube,selected_Categories,selected_Media):
+    df_filtered = cube.summarize(['Press', 'Category'], presses=selected_Media, categories=selected_Categories)
     df_filtered["Mean"] = df_filtered["IsClickbait"] / df_filtered["Count_News"]
     fig_clickbait_category = px.bar(df_filtered, x='Press', y='Count_News', color='Category', title='各類別新聞資料數',labels={'Mean':'Data Count'},barmode='group')
     fig_clickbait_category.update_layout(autosize=True)
-    # 在 Streamlit 上顯示圖表
-    st.plotly_chart(fig_clickbait_category, use_container_width=True)
+    return fig_clickbait_category
 
-def bait_count(df,selected_Media):
-    df_filtered = df[df['Press'].isin(selected_Media)]
-    df_group = df_filtered.groupby(["Press"]).sum().reset_index()
+@timed
+@cached_figure
+def bait_count(cube,selected_Media,show_interval):
+    df_group = cube.summarize(['Press'], presses=selected_Media)
     df_group["Mean"] = df_group["IsClickbait"] / df_group["Count_News"]
-    fig_clickbait_category = px.bar(df_group, x='Press', y='Mean', color='Mean', title='媒體間釣餌式標題比例',labels={'Mean':'Click-bait ratio'},barmode='group',hover_data={'Mean':':.2f'})
+    error_bars = ErrorBars(df_group, 'IsClickbait', 'Count_News', 'Mean') if show_interval else {}
+    fig_clickbait_category = px.bar(df_group, x='Press', y='Mean', color='Mean', title='媒體間釣餌式標題比例',labels={'Mean':'Click-bait ratio'},barmode='group',hover_data={'Mean':':.2f'},**error_bars)
     fig_clickbait_category.update_traces(width=0.7)
     fig_clickbait_category.update_layout(autosize=True)
-    # 在 Streamlit 上顯示圖表
-    st.plotly_chart(fig_clickbait_category, use_container_width=True)
+    return fig_clickbait_category
     
-def  media_clickbait(df,selected_Categories,selected_Media):
-    df_filtered = df[df['Press'].isin(selected_Media)]
-    df_filtered = df_filtered[df_filtered['Category'].isin(selected_Categories)]
+@timed
+@cached_figure
+def  media_clickbait(cube,selected_Categories,selected_Media,show_interval):
+    df_filtered = cube.summarize(['Press', 'Category'], presses=selected_Media, categories=selected_Categories)
     df_filtered["Mean"] = df_filtered["IsClickbait"] / df_filtered["Count_News"]
+    error_bars = ErrorBars(df_filtered, 'IsClickbait', 'Count_News', 'Mean') if show_interval else {}
     # df_filtered['Category'] = pd.Categorical(df_filtered['Category'], categories=category_order, ordered=True)
     # fig_clickbait_category = px.bar(df_filtered, x='Press', y='Mean', color='Category',color_discrete_map=category_color_map, title='各類別誘餌式標題比例',labels={'Mean':'Click bait ratio'},barmode='group')
-    fig_clickbait_category = px.bar(df_filtered, x='Press', y='Mean', color='Category', title='各類別誘餌式標題比例',labels={'Mean':'Click bait ratio'},barmode='group',hover_data={'Mean':':.2f'})
+    fig_clickbait_category = px.bar(df_filtered, x='Press', y='Mean', color='Category', title='各類別誘餌式標題比例',labels={'Mean':'Click bait ratio'},barmode='group',hover_data={'Mean':':.2f'},**error_bars)
     fig_clickbait_category.update_layout(autosize=True)
-    # 在 Streamlit 上顯示圖表
-    st.plotly_chart(fig_clickbait_category, use_container_width=True)
+    return fig_clickbait_category
     
-def category_bait_type(df,selected_Categories,selected_Bait):
+@timed
+@cached_figure
+def category_bait_type(cube,selected_Categories,selected_Bait,show_interval):
     columns_to_aggregate = ["Count_News",'IsClickbait',*selected_Bait]
 
-    aggregated_data = df.groupby(['Category'])[columns_to_aggregate].sum().reset_index()
+    aggregated_data = cube.summarize(['Category'])[['Category', *columns_to_aggregate]]
     df_melted = aggregated_data.melt(id_vars=['Category', 'Count_News', 'IsClickbait'], value_vars=selected_Bait, var_name='Method', value_name='Method_Count')
     # Calculate the method percentage of the total news count
     df_melted['Method_Percentage'] = (df_melted['Method_Count'] / df_melted['Count_News'])
+    error_bars = ErrorBars(df_melted, 'Method_Count', 'Count_News', 'Method_Percentage') if show_interval else {}
     
     df_melted = df_melted[df_melted['Category'].isin(selected_Categories)]
     
     # Create the scatter plot using Plotly Express
     fig = px.scatter(df_melted, x='Category', y='Method_Percentage',size='Method_Percentage',color='Method', color_discrete_map=bait_color_map,
-                    hover_data={'Method_Percentage':':.2f'}, title='各誘餌方法佔類別比例')
+                    hover_data={'Method_Percentage':':.2f'}, title='各誘餌方法佔類別比例',**error_bars)
 
-    top_methods = df_melted.groupby('Category').apply(lambda x: x.nlargest(3, 'Method_Percentage')).reset_index(drop=True)
+    top_methods = df_melted.groupby('Category', observed=True).apply(lambda x: x.nlargest(3, 'Method_Percentage')).reset_index(drop=True)
     for i in range(len(top_methods)):
         if (i+1)%3 ==1:y = -25
         elif (i+1)%3 ==2:y = -15
@@ -125,137 +196,265 @@ def category_bait_type(df,selected_Categories,selected_Bait):
         )
 
     fig.update_layout(autosize=True)
-    # 在 Streamlit 上顯示圖表
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 # Ding & Iting: long term plot
-def MediaTimePlot(df, selected_Media):
+@timed
+@cached_figure
+def MediaTimePlot(cube, start_date, end_date, selected_Media, show_interval):
     From2018 = ['ETToday', '今日新聞', 'Storm Media', 'NewYorkTimes', 'NewsLens', 'TVBS', '報導者']
-    df_filtered = df[df['Press'].isin(From2018)]
-    df_filtered = df_filtered[df_filtered['Press'].isin(selected_Media)]
-    df_filtered['MonthYear'] = df_filtered['Date'].astype(str).str[:7]
-    df_filtered = df_filtered.groupby(['Press', 'MonthYear']).agg({'Count_News': 'sum','IsClickbait': 'sum'}).reset_index()
+    presses = [press for press in From2018 if press in selected_Media]
+    df_filtered = cube.summarize(['Press'], start_date, end_date, presses=presses, monthly=True)[['Press', 'MonthYear', 'Count_News', 'IsClickbait']]
     df_filtered["ratio"] = df_filtered["IsClickbait"]/df_filtered["Count_News"]
     # 計算每個新聞媒體每個月的平均值
 
-    df_filtered['SmoothedClickbait'] = df_filtered.groupby('Press')['ratio'].transform(lambda x: x.rolling(window=4).mean())
+    df_filtered['SmoothedClickbait'] = df_filtered.groupby('Press', observed=True)['ratio'].transform(lambda x: x.rolling(window=4).mean())
     fig = px.line(df_filtered, x='MonthYear', y='SmoothedClickbait',
                   color='Press', color_discrete_map=media_color_map, title='各媒體誘餌式標題比例')
-    df_filtered = df[df['Press'].isin(selected_Media)]
-    fig.update_layout(xaxis_title='Time (Monthly)',yaxis_title='Clickbait Ratio', legend_title='新聞媒體',autosize=True)
+    if show_interval:
+        # 上下界與比例用相同的移動平均
+        AddInterval(df_filtered, 'IsClickbait', 'Count_News')
+        df_filtered[['Lower', 'Upper']] = df_filtered.groupby('Press', observed=True)[['Lower', 'Upper']].transform(lambda x: x.rolling(window=4).mean())
+        AddIntervalBands(fig, df_filtered, 'Press')
     # Customize the layout
-    st.plotly_chart(fig, use_container_width=True)
+    fig.update_layout(xaxis_title='Time (Monthly)',yaxis_title='Clickbait Ratio', legend_title='新聞媒體',autosize=True)
+    return fig
 
 
-def CategoryTimePlot(df, selected_categories):
+@timed
+@cached_figure
+def CategoryTimePlot(cube, start_date, end_date, selected_categories, show_elections, show_interval):
     From2018 = ['ETToday', '今日新聞', 'Storm Media', 'NewYorkTimes', 'NewsLens', 'TVBS', '報導者']
-    df_filtered = df[df['Press'].isin(From2018)]
-    df_filtered = df_filtered[df_filtered['Category'].isin(selected_categories)]
-    df_filtered['MonthYear'] = df_filtered['Date'].astype(str).str[:7]
-    df_filtered = df_filtered.groupby(['Category', 'MonthYear']).agg({'Count_News': 'sum','IsClickbait': 'sum'}).reset_index()
+    df_filtered = cube.summarize(['Category'], start_date, end_date, presses=From2018, categories=selected_categories, monthly=True)[['Category', 'MonthYear', 'Count_News', 'IsClickbait']]
     df_filtered["ratio"] = df_filtered["IsClickbait"]/df_filtered["Count_News"]
-    df_filtered['SmoothedClickbait'] = (df_filtered.groupby('Category')['ratio'].transform(lambda x: x.ewm(alpha=alpha, adjust=False).mean()))
+    df_filtered['SmoothedClickbait'] = (df_filtered.groupby('Category', observed=True)['ratio'].transform(lambda x: x.ewm(alpha=alpha, adjust=False).mean()))
     fig = px.line(df_filtered, x='MonthYear', y='SmoothedClickbait',
                   color='Category', color_discrete_map=category_color_map, title='各類別新聞誘餌式比例')
+    if show_interval:
+        AddInterval(df_filtered, 'IsClickbait', 'Count_News')
+        df_filtered[['Lower', 'Upper']] = df_filtered.groupby('Category', observed=True)[['Lower', 'Upper']].transform(lambda x: x.ewm(alpha=alpha, adjust=False).mean())
+        AddIntervalBands(fig, df_filtered, 'Category')
     fig.update_layout(xaxis_title='Time (Monthly)', yaxis_title='Clickbait Ratio', legend_title='新聞類別',autosize=True)
-    # Add a shaded region using add_shape
-    if st.checkbox('顯示大選期間'):
+    if show_elections:
         # st.write(', '.join(['2018-07-24','2018-11-30','2019-09-11','2020-01-31','2022-07-26','2022-11-30']))
+        # 分割的 panel 取 first_date 可能需要讀檔，只查一次
+        first_date = cube.first_date(start_date, end_date)
         for start, end in [('2018-07-24','2018-11-30'),('2019-09-11','2020-01-31'),('2022-07-26','2022-11-30')]:
-            if pd.to_datetime(start) <= pd.to_datetime(df['Date'].min()):
+            if first_date is not None and pd.to_datetime(start) <= first_date:
                 continue
             fig.add_vrect(x0=start, x1=end,
                         fillcolor='LightSalmon', opacity=0.3, layer='below', line_width=0)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-def BaitMethodTimePlot(df, selected_baits):
+@timed
+@cached_figure
+def BaitMethodTimePlot(cube, start_date, end_date, selected_baits, show_interval):
     From2018 = ['ETToday', '今日新聞', 'Storm Media', 'NewYorkTimes', 'NewsLens', 'TVBS', '報導者']
 
-    df_filtered = df[df['Press'].isin(From2018)]
-    # 新增"年-月"的列，以月份分組並平均，每周的權重都一樣，不管資料數
-    df_filtered['MonthYear'] = df['Date'].astype(str).str[:7]
+    # 以月份分組並平均，每周的權重都一樣，不管資料數
     li = ["Count_News"]+selected_baits
-    df_filtered = df_filtered.groupby('MonthYear')[li].sum().reset_index()
+    summary = cube.summarize([], start_date, end_date, presses=From2018, monthly=True)
+    df_filtered = summary[['MonthYear', *li]].copy()
     for category in selected_baits:
         df_filtered[category] = df_filtered[category]/df_filtered["Count_News"]
-    print(df_filtered)
     # 處理資料以對"時間-BaitType"做圖
     df_melted = pd.melt(df_filtered, id_vars=['MonthYear'], value_vars=selected_baits, var_name='BaitType', value_name='BaitRatio')
-    print(df_melted)
     df_melted['SmoothedClickbait'] = df_melted.groupby('BaitType')['BaitRatio'].transform(lambda x: x.rolling(window=4).mean())
     
     fig = px.line(df_melted, x='MonthYear', y='SmoothedClickbait',
                   color='BaitType', color_discrete_map=bait_color_map, title='各誘餌式方法占全部新聞比例')
+    if show_interval:
+        # 各方法的次數 (還沒除以新聞數) 與新聞數，全部方法的區間一次算完
+        counts = pd.melt(summary, id_vars=['MonthYear', 'Count_News'], value_vars=selected_baits, var_name='BaitType', value_name='BaitCount')
+        AddInterval(counts, 'BaitCount', 'Count_News')
+        counts[['Lower', 'Upper']] = counts.groupby('BaitType')[['Lower', 'Upper']].transform(lambda x: x.rolling(window=4).mean())
+        AddIntervalBands(fig, counts, 'BaitType')
     fig.update_layout(xaxis_title='Time (Monthly)', yaxis_title='Bait Type Ratio', legend_title='釣魚方法',autosize=True)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
     
+# 啟動時先建立預設篩選條件下的圖表，之後的頁面瀏覽直接從快取取得
+@st.cache_resource
+def WarmFigureCache(weekly_version, three_month_version):
+    media_count(three_moth_cube, default_categories, default_media)
+    bait_count(three_moth_cube, default_media, False)
+    media_clickbait(three_moth_cube, default_categories, default_media, False)
+    category_bait_type(three_moth_cube, default_categories, bait_options, False)
+    MediaTimePlot(cube, default_start_date, default_end_date, default_media, False)
+    CategoryTimePlot(cube, default_start_date, default_end_date, default_categories, False, False)
+    BaitMethodTimePlot(cube, default_start_date, default_end_date, bait_options, False)
+
+WarmFigureCache(cube.version, three_moth_cube.version)
+
+# 把 figure 序列化並送到前端
+def ShowChart(fig, key=None):
+    with stage('plotly_chart'):
+        if key is None:
+            return st.plotly_chart(fig, use_container_width=True)
+        # 可點選的圖表：點選資料點後重跑並回傳選取的點
+        return st.plotly_chart(fig, use_container_width=True, key=key, on_select='rerun', selection_mode='points')
+
+def SelectedPoint(event, fig):
+    # 回傳點選的 (x 值, 圖例名稱)，沒有點選時回傳 None
+    points = event.selection.points if event else []
+    if not points:
+        return None
+    return points[0]['x'], fig.data[points[0]['curve_number']].name
+
+# 列出符合條件的標題 (從 posting list 索引查詢，不掃描資料)
+def TitleDrillDown(caption, **query):
+    title_index = GetTitleIndex()
+    if title_index is None:
+        st.info('沒有標題資料：以 `python pipeline.py build <原始標題檔> --dedup press` 產生後即可查看個別標題')
+        return
+    with stage('TitleDrillDown'):
+        total, titles = title_index.query(**query)
+    st.caption(f'{caption}：共 {total} 則，列出最新 {len(titles)} 則')
+    st.dataframe(titles, hide_index=True, use_container_width=True)
+
+# 只有目前顯示的分頁會執行，st.tabs 會把隱藏分頁的圖表也全部算完
+def ThreeMonthTab(selected_categories, selected_media, selected_bait, show_interval):
+    ShowChart(media_count(three_moth_cube ,selected_categories,selected_media))
+    with st.expander('## **我們的觀點：**'):
+        st.markdown("這是我們搜集到從2023年8月到10月的資料數量，娛樂類、政治類新聞在各媒體間均佔比較高的比例\n\n需要注意的是三立我們是採用抽樣的數據取1/6筆，所以真正的數量應該為6倍")
+    ShowChart(bait_count(three_moth_cube ,selected_media, show_interval))
+    with st.expander('## **我們的觀點：**'):
+        st.markdown("我們發現有政黨傾向的媒體以及以網路娛樂媒體起家的有較高的釣餌式比例\n\n 報導者近三個月內的新聞比數非常少，可能不具備參考性")
+    fig = media_clickbait(three_moth_cube ,selected_categories,selected_media, show_interval)
+    selected = SelectedPoint(ShowChart(fig, key='media_clickbait'), fig)
+    if selected:
+        press, category = selected
+        TitleDrillDown(f'{press} / {category} 的釣餌式標題', presses=[press], categories=[category], method='IsClickbait', three_month=True)
+    with st.expander('## **我們的觀點：**'):
+        st.markdown("- 多數媒體在娛樂類新聞的釣餌式比例最高、在財經類新 聞的釣餌式比例最低\n\n- 我們預期台灣政治類新聞的釣餌式比例也會偏高，但資料顯示並沒有特別高於其他類別\n\n- 單獨看政治類新聞的釣餌式標題比例。我們發現國內民眾普遍認為政治傾向強烈的兩家媒體，其釣餌式標題比 例排名在第二與第三名 (排除掉報導者後)")
+        st.markdown("- 娛樂類新聞的閱聽者通常是為了跟上時事湊熱鬧\n\n   ➔ 媒體也更喜愛使用釣魚式標題吸引閱聽者的注意，進而點擊進去看更詳細的內容\n\n- 財經類新聞的閱聽者通常希望獲得正確且專業的資訊\n\n    ➔ 使用釣餌式標題反而會降低新聞專業度，使閱聽者點擊的機會下降，因此各媒體在財經類的釣餌式標題比例最低")
+        
+    ShowChart(category_bait_type(three_moth_cube,selected_categories,selected_bait,show_interval))
+    with st.expander('## **我們的觀點：**'):
+        st.markdown("情緒性用詞(emotional)與誇大用詞(exaggerate)都排名前段， 表示各類新聞皆偏愛將這兩類的字詞放在標題中")
+        st.markdown("- 在釣餌式標題比例最高的娛樂類新聞中，前三高的誘餌方法為情緒性、誇大與結尾「了」\n\n   - Ex:「狠嗆媽媽太爛了 許老三挑戰小S九九乘法糗NG」(鏡新聞, 2022.03.17)\n\n   情緒性用詞為「嗆」，誇大用詞為「狠」，新聞標題存在結尾「了」字\n\n- 清單(list)為健康類常見的誘餌方式，這樣的標題無法提供有效資訊，需要點擊進去才能知道新聞的內容是什麼\n\n    - Ex:「脖子長腫塊怎麼辦？4類人小心甲狀腺結節 3症狀速就醫」(TVBS新聞網, 2023/12/19)")
+
+def LongTermTab(start_date, end_date, selected_media, selected_categories, selected_bait, show_interval):
+    st.subheader('時間趨勢分析')
+    st.markdown("我們選取資料完整的做2018~2023的時間趨勢分析（ ETToday、NewYorkTimes、NewsLens、Storm Media、今日新聞、報導者）")
+    ShowChart(MediaTimePlot(cube, start_date, end_date, selected_media, show_interval))
+    with st.expander('## **我們的觀點：**'):
+        st.markdown("- **風傳媒**的釣餌式新聞標題比例最高，為44%，但他的趨勢是最為明顯向下的\n\n- 再來第二名則是 ETToday 的 38% 且幾乎在5年內沒有太大的變化，釣餌式標題比例最低的媒體為 New York Times")
+    CategoryTimeSection(start_date, end_date, selected_categories, show_interval)
+    with st.expander('## **我們的觀點：**'):
+        st.markdown("- 「娛樂」類新聞的釣餌式標題比例高於其他類別，為 58%，「財經」類新聞則有最低比例的釣餌式標題，為 16%\n\n- 生活類和健康類新聞的釣餌式標題比例也較高，與預期結果相符；不同的是政治類新聞比例較預期低")
+    fig = BaitMethodTimePlot(cube, start_date, end_date, selected_bait, show_interval)
+    selected = SelectedPoint(ShowChart(fig, key='bait_method_time'), fig)
+    if selected:
+        # x 軸是月份 (plotly 可能回傳 YYYY-MM-DD)
+        month, method = str(selected[0])[:7], selected[1]
+        month_start, month_end = month_range(month)
+        TitleDrillDown(f'{month} 使用 {method} 的標題', presses=long_term_media, method=method, start_date=month_start, end_date=month_end)
+    with st.expander('## **我們的觀點：**'):
+        st.markdown("前項指涉、強烈情緒字詞、誇大是所有的釣餌式標題樣本中最常被使用的手法")
+
+# 勾選「顯示大選期間」只重跑這個 fragment
+@st.fragment
+def CategoryTimeSection(start_date, end_date, selected_categories, show_interval):
+    # Add a shaded region using add_shape
+    show_elections = st.checkbox('顯示大選期間')
+    ShowChart(CategoryTimePlot(cube, start_date, end_date, selected_categories, show_elections, show_interval))
+
+def TitleSearchTab(selected_media, selected_categories):
+    st.subheader('標題查詢')
+    st.markdown("選擇媒體、類別、釣魚方法與月份，列出符合的新聞標題；也可以直接點選「各類別誘餌式標題比例」或「各誘餌式方法占全部新聞比例」圖上的資料點")
+    title_index = GetTitleIndex()
+    if title_index is None:
+        st.info('沒有標題資料：以 `python pipeline.py build <原始標題檔> --dedup press` 產生後即可查看個別標題')
+        return
+    TitleSearch(title_index, selected_media, selected_categories)
+
+# 調整查詢條件只重跑這個 fragment
+@st.fragment
+def TitleSearch(title_index, selected_media, selected_categories):
+    method = st.selectbox('釣魚方法', ['IsClickbait', *bait_options])
+    months = title_index.months()
+    month = st.select_slider('月份', months, value=months[-1]) if months else None
+    month_start, month_end = month_range(month) if month else (None, None)
+    TitleDrillDown(f'{month} 使用 {method} 的標題', presses=selected_media, categories=selected_categories, method=method,
+                   start_date=month_start, end_date=month_end)
+
+def DetectorTab():
+    st.header('判斷文字是否為釣餌式標題')
+    Detector()
+    st.header("判斷是否為釣餌式標題之方法")
+    for i, criterion in enumerate(criteria_list, start=1):
+        st.write(f"{i}. {criterion}")
+    criterion_note = '<p style="font-family:sans-serif; color:#FFA500; font-size: 18px;">根據論文研究結果1~7點較具判斷力，因此若符合一項即判定為釣餌式標題。而總共符合兩項以上特徵，我們也將判定為釣餌式標題。</p>'
+    st.markdown(criterion_note, unsafe_allow_html=True)
+
+# 輸入標題並按下 Detect 只重跑這個 fragment，不會重新計算其他圖表
+@st.fragment
+def Detector():
+    user_input = st.text_area("請輸入新聞標題文字:")
+    if st.button("Detect"):
+        # Call the function to determine if it's clickbait
+        result = is_clickbait(user_input)
+
+        # Display the result based on the return value
+        if result == 1:
+            detect_result = '<p style="font-family:sans-serif; color:#FF6600; font-size: 22px;">可能是釣餌式標題</p>'
+            st.markdown(detect_result, unsafe_allow_html=True)
+        else:
+            detect_result = '<p style="font-family:sans-serif; color:#FFA500; font-size: 22px;">應不是釣餌式標題</p>'
+            st.markdown(detect_result, unsafe_allow_html=True)
+
+# 勾選「顯示篩選後的數據」只重跑這個 fragment，沒勾選時不會取資料
+@st.fragment
+def FilteredData(start_date, end_date):
+    if st.checkbox('顯示篩選後的數據'):
+        # Filter data based on selections，分頁顯示，不一次讀出整個區間
+        with stage('SelectDate'):
+            total = CountRows(dataset, dataset.version, start_date, end_date)
+            pages = max((total + raw_page_rows - 1) // raw_page_rows, 1)
+            page = st.number_input(f'頁數 (共 {pages} 頁、{total} 筆)', 1, pages, 1) - 1
+            filtered_df = SelectDate(dataset, dataset.version, start_date, end_date, page)
+        st.write(filtered_df)
+
 def run():
     # Sidebar filters
     with st.sidebar:
         st.header('篩選選項')
-        start_date = st.date_input('開始日期', df['Date'].min())
-        end_date = st.date_input('結束日期', df['Date'].max())
-        selected_media = st.multiselect('選擇媒體', media_options, default=df['Press'].unique())
-        selected_categories = st.multiselect("選擇新聞類別", category_options, default=df['Category'].unique())
+        start_date = st.date_input('開始日期', default_start_date)
+        end_date = st.date_input('結束日期', default_end_date)
+        selected_media = st.multiselect('選擇媒體', media_options, default=default_media)
+        selected_categories = st.multiselect("選擇新聞類別", category_options, default=default_categories)
         selected_bait = st.multiselect("選擇釣魚方法", bait_options, default=bait_options)
+        # 比例圖加上 95% 信賴區間 (新聞數少的媒體區間較寬)
+        show_interval = st.checkbox('顯示信賴區間')
     st.title('台灣網路新聞釣餌式標題分析')
-    # Filter data based on selections
-    filtered_df = SelectDate(df, start_date, end_date)
     st.markdown("由於各家媒體的網站皆不同，每間媒體我們能抓取到的最早日期都不太一致，所以我們最終決定\n\n   ➔ 統一取2023.08~2023.10，用3個月內的資料做跨媒體的分析\n\n   ➔ 取資料完整的做2018~2023的時間趨勢分析（ ETToday、NewYorkTimes、NewsLens、Storm Media、今日新聞、報導者）")
-    if st.checkbox('顯示篩選後的數據'):
-        st.write(filtered_df)
-    
-    list_tab = ["三個月分析", "長期分析", "釣餌式標題識別器"]
-    tab1, tab2,tab3 = st.tabs([s.center(16,"\u2001") for s in list_tab])
-    with tab1:
-        media_count(three_moth_df ,selected_categories,selected_media)
-        with st.expander('## **我們的觀點：**'):
-            st.markdown("這是我們搜集到從2023年8月到10月的資料數量，娛樂類、政治類新聞在各媒體間均佔比較高的比例\n\n需要注意的是三立我們是採用抽樣的數據取1/6筆，所以真正的數量應該為6倍")
-        bait_count(three_moth_df ,selected_media)
-        with st.expander('## **我們的觀點：**'):
-            st.markdown("我們發現有政黨傾向的媒體以及以網路娛樂媒體起家的有較高的釣餌式比例\n\n 報導者近三個月內的新聞比數非常少，可能不具備參考性")
-        media_clickbait(three_moth_df ,selected_categories,selected_media)
-        with st.expander('## **我們的觀點：**'):
-            st.markdown("- 多數媒體在娛樂類新聞的釣餌式比例最高、在財經類新 聞的釣餌式比例最低\n\n- 我們預期台灣政治類新聞的釣餌式比例也會偏高，但資料顯示並沒有特別高於其他類別\n\n- 單獨看政治類新聞的釣餌式標題比例。我們發現國內民眾普遍認為政治傾向強烈的兩家媒體，其釣餌式標題比 例排名在第二與第三名 (排除掉報導者後)")
-            st.markdown("- 娛樂類新聞的閱聽者通常是為了跟上時事湊熱鬧\n\n   ➔ 媒體也更喜愛使用釣魚式標題吸引閱聽者的注意，進而點擊進去看更詳細的內容\n\n- 財經類新聞的閱聽者通常希望獲得正確且專業的資訊\n\n    ➔ 使用釣餌式標題反而會降低新聞專業度，使閱聽者點擊的機會下降，因此各媒體在財經類的釣餌式標題比例最低")
-            
-        category_bait_type(three_moth_df,selected_categories,selected_bait)
-        with st.expander('## **我們的觀點：**'):
-            st.markdown("情緒性用詞(emotional)與誇大用詞(exaggerate)都排名前段， 表示各類新聞皆偏愛將這兩類的字詞放在標題中")
-            st.markdown("- 在釣餌式標題比例最高的娛樂類新聞中，前三高的誘餌方法為情緒性、誇大與結尾「了」\n\n   - Ex:「狠嗆媽媽太爛了 許老三挑戰小S九九乘法糗NG」(鏡新聞, 2022.03.17)\n\n   情緒性用詞為「嗆」，誇大用詞為「狠」，新聞標題存在結尾「了」字\n\n- 清單(list)為健康類常見的誘餌方式，這樣的標題無法提供有效資訊，需要點擊進去才能知道新聞的內容是什麼\n\n    - Ex:「脖子長腫塊怎麼辦？4類人小心甲狀腺結節 3症狀速就醫」(TVBS新聞網, 2023/12/19)")
-        
-    with tab2:
-        st.subheader('時間趨勢分析')
-        st.markdown("我們選取資料完整的做2018~2023的時間趨勢分析（ ETToday、NewYorkTimes、NewsLens、Storm Media、今日新聞、報導者）")
-        MediaTimePlot(filtered_df, selected_media)
-        with st.expander('## **我們的觀點：**'):
-            st.markdown("- **風傳媒**的釣餌式新聞標題比例最高，為44%，但他的趨勢是最為明顯向下的\n\n- 再來第二名則是 ETToday 的 38% 且幾乎在5年內沒有太大的變化，釣餌式標題比例最低的媒體為 New York Times")
-        CategoryTimePlot(filtered_df, selected_categories)
-        with st.expander('## **我們的觀點：**'):
-            st.markdown("- 「娛樂」類新聞的釣餌式標題比例高於其他類別，為 58%，「財經」類新聞則有最低比例的釣餌式標題，為 16%\n\n- 生活類和健康類新聞的釣餌式標題比例也較高，與預期結果相符；不同的是政治類新聞比例較預期低")
-        BaitMethodTimePlot(filtered_df, selected_bait)
-        with st.expander('## **我們的觀點：**'):
-            st.markdown("前項指涉、強烈情緒字詞、誇大是所有的釣餌式標題樣本中最常被使用的手法")
-    with tab3:
-        st.header('判斷文字是否為釣餌式標題')
-        user_input = st.text_area("請輸入新聞標題文字:")
-        if st.button("Detect"):
-            # Call the function to determine if it's clickbait
-            result = is_clickbait(user_input)
-
-            # Display the result based on the return value
-            if result == 1:
-                detect_result = '<p style="font-family:sans-serif; color:#FF6600; font-size: 22px;">可能是釣餌式標題</p>'
-                st.markdown(detect_result, unsafe_allow_html=True)
-            else:
-                detect_result = '<p style="font-family:sans-serif; color:#FFA500; font-size: 22px;">應不是釣餌式標題</p>'
-                st.markdown(detect_result, unsafe_allow_html=True)
-
-        st.header("判斷是否為釣餌式標題之方法")
-        for i, criterion in enumerate(criteria_list, start=1):
-            st.write(f"{i}. {criterion}")
-        criterion_note = '<p style="font-family:sans-serif; color:#FFA500; font-size: 18px;">根據論文研究結果1~7點較具判斷力，因此若符合一項即判定為釣餌式標題。而總共符合兩項以上特徵，我們也將判定為釣餌式標題。</p>'
-        st.markdown(criterion_note, unsafe_allow_html=True)
+    FilteredData(start_date, end_date)
+
+    list_tab = ["三個月分析", "長期分析", "標題查詢", "釣餌式標題識別器"]
+    tab = st.radio('分頁', list_tab, horizontal=True, label_visibility='collapsed', key='tab')
+    with stage(f'tab:{tab}'):
+        if tab == list_tab[0]:
+            ThreeMonthTab(selected_categories, selected_media, selected_bait, show_interval)
+        elif tab == list_tab[1]:
+            LongTermTab(start_date, end_date, selected_media, selected_categories, selected_bait, show_interval)
+        elif tab == list_tab[2]:
+            TitleSearchTab(selected_media, selected_categories)
+        else:
+            DetectorTab()
+
+    stages = profiling.end_run(tab=tab, start_date=start_date, end_date=end_date)
+    # 開啟 CLICKBAIT_PROFILE 並在網址加上 ?debug=1 才會顯示
+    if profiling.ENABLED and st.query_params.get('debug') == '1':
+        DebugPanel(stages)
+
+def DebugPanel(stages):
+    with st.sidebar.expander('Debug: profiling', expanded=True):
+        st.caption('這次 rerun 各階段耗時 (ms)')
+        st.dataframe(pd.DataFrame(stages), hide_index=True)
+        st.caption('累計各階段耗時')
+        st.dataframe(pd.DataFrame(profiling.stage_stats()), hide_index=True)
+        st.caption('各判斷方法的命中率')
+        st.dataframe(pd.DataFrame(criterion_stats()), hide_index=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+import argparse
+import inspect
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from multiprocessing import get_context
+
+import numpy as np
+
+from is_clickbait import (KEYWORD_CRITERIA, LIST_QUANTIFIERS, LOOKAHEAD_CRITERIA, PUNCTUATION_MARKS, is_clickbait,
+                          score_titles)
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+CHUNK_SIZE = 100_000
+# 單筆延遲最多記錄的筆數
+MAX_LATENCY_SAMPLES = 200_000
+# 與 baseline 比較時允許的誤差 (20%)
+DEFAULT_TOLERANCE = 0.2
+# 同時開著 app 的 session 數
+DEFAULT_SESSIONS = 50
+BASELINE_FILE = 'benchmark_baseline.json'
+
+
+def criteria_vocabulary():
+    # criterion_1 ~ criterion_15 用到的所有關鍵字、排除字、標點與量詞
+    words = set(PUNCTUATION_MARKS) | set(LIST_QUANTIFIERS) | set('一二三四五六七八九十0123456789月')
+    for keywords in KEYWORD_CRITERIA.values():
+        words.update(keywords)
+    for keywords, excluded in LOOKAHEAD_CRITERIA.values():
+        words.update(keywords)
+        words.update(excluded)
+    return sorted(words)
+
+
+def synthetic_titles(n, seed=0, chunk_size=CHUNK_SIZE):
+    # 以關鍵字與一般中文字混合產生假標題，每次產生 chunk_size 筆以限制記憶體
+    rng = np.random.default_rng(seed)
+    keywords = np.array(criteria_vocabulary(), dtype=object)
+    filler = np.array([chr(code) for code in rng.choice(np.arange(0x4E00, 0x9FA6), 3000, replace=False)], dtype=object)
+    for start in range(0, n, chunk_size):
+        size = min(chunk_size, n - start)
+        lengths = rng.integers(6, 20, size)
+        total = int(lengths.sum())
+        # 約 15% 的 token 是判斷方法的關鍵字
+        is_keyword = rng.random(total) < 0.15
+        tokens = np.where(is_keyword, keywords[rng.integers(0, len(keywords), total)],
+                          filler[rng.integers(0, len(filler), total)])
+        ends = np.cumsum(lengths)
+        yield ["".join(tokens[end - length:end]) for end, length in zip(ends, lengths)]
+
+
+def summarize(name, latencies, items, elapsed):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        'case': name,
+        'items': items,
+        'seconds': elapsed,
+        'throughput': items / elapsed if elapsed else float('inf'),
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+    }
+
+
+def bench_score_single(n):
+    # 逐筆判斷 (is_clickbait)
+    latencies = []
+    elapsed = 0.0
+    for titles in synthetic_titles(n):
+        for title in titles:
+            start = time.perf_counter()
+            is_clickbait(title)
+            took = time.perf_counter() - start
+            elapsed += took
+            if len(latencies) < MAX_LATENCY_SAMPLES:
+                latencies.append(took)
+    return summarize(f'score_single[{n}]', latencies, n, elapsed)
+
+
+def bench_score_reference(n):
+    # 對照：原本逐一掃描 15 個判斷方法的寫法 (tests/reference_criteria.py)
+    from tests.reference_criteria import is_clickbait as reference_is_clickbait
+    latencies = []
+    elapsed = 0.0
+    for titles in synthetic_titles(n):
+        for title in titles:
+            start = time.perf_counter()
+            reference_is_clickbait(title)
+            took = time.perf_counter() - start
+            elapsed += took
+            if len(latencies) < MAX_LATENCY_SAMPLES:
+                latencies.append(took)
+    return summarize(f'score_reference[{n}]', latencies, n, elapsed)
+
+
+def bench_score_batch(n):
+    # score_titles 每批 CHUNK_SIZE 筆，延遲以批為單位
+    latencies = []
+    for titles in synthetic_titles(n):
+        start = time.perf_counter()
+        score_titles(titles)
+        latencies.append(time.perf_counter() - start)
+    return summarize(f'score_batch[{n}]', latencies, n, sum(latencies))
+
+
+def load_app():
+    # 匯入 app.py 取得圖表函式 (不經過 Streamlit server)
+    logging.disable(logging.WARNING)
+    warnings.simplefilter('ignore')
+    import app
+    return app
+
+
+def repeat(name, function, arguments):
+    latencies = []
+    for args in arguments:
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - start)
+    return summarize(name, latencies, len(latencies), sum(latencies))
+
+
+def bench_load_cold(csv_path='panel_data_weekly.csv'):
+    # 沒有 parquet 快取：讀 CSV、轉型並建立快取；在暫存目錄的複本上量測，不動工作目錄的快取
+    from panel_data import PanelDataset, cache_path
+    with tempfile.TemporaryDirectory() as tmp:
+        cold_path = shutil.copy(csv_path, tmp)
+
+        def load():
+            if os.path.exists(cache_path(cold_path)):
+                os.remove(cache_path(cold_path))
+            PanelDataset(cold_path)
+        return repeat('GetProcessedData[cold]', load, [()] * 5)
+
+
+def bench_load_warm(csv_path='panel_data_weekly.csv'):
+    # 已有 parquet 快取：新 process 第一次載入
+    from panel_data import PanelDataset, load_panel
+    load_panel(csv_path)
+    return repeat('GetProcessedData[warm]', PanelDataset, [(csv_path,)] * 20)
+
+
+def random_ranges(dataset, count, seed=0):
+    rng = random.Random(seed)
+    first, last = dataset.frame['Date'].min().date(), dataset.frame['Date'].max().date()
+    days = (last - first).days
+    ranges = []
+    for _ in range(count):
+        start = first + timedelta(days=rng.randint(0, days))
+        ranges.append((start, start + timedelta(days=rng.randint(30, days))))
+    return ranges
+
+
+def bench_select_date():
+    from panel_data import PanelDataset
+    dataset = PanelDataset('panel_data_weekly.csv')
+    return repeat('SelectDate', dataset.select_date, random_ranges(dataset, 1000))
+
+
+def bench_charts():
+    # 各圖表的彙總與 figure 建立 (不含瀏覽器繪圖)，繞過圖表快取
+    app = load_app()
+    ranges = random_ranges(app.dataset, 50)
+    three_month = (app.three_moth_cube, app.default_categories, app.default_media)
+    cases = [
+        ('media_count', 'media_count', [three_month] * 50),
+    ]
+    # 比例圖另外量測加上信賴區間 (show_interval) 的成本
+    for show_interval in [False, True]:
+        suffix = '+interval' if show_interval else ''
+        cases += [
+            ('bait_count' + suffix, 'bait_count', [(app.three_moth_cube, app.default_media, show_interval)] * 50),
+            ('media_clickbait' + suffix, 'media_clickbait', [(*three_month, show_interval)] * 50),
+            ('category_bait_type' + suffix, 'category_bait_type',
+             [(app.three_moth_cube, app.default_categories, app.bait_options, show_interval)] * 50),
+            ('MediaTimePlot' + suffix, 'MediaTimePlot',
+             [(app.cube, start, end, app.default_media, show_interval) for start, end in ranges]),
+            ('CategoryTimePlot' + suffix, 'CategoryTimePlot',
+             [(app.cube, start, end, app.default_categories, False, show_interval) for start, end in ranges]),
+            ('BaitMethodTimePlot' + suffix, 'BaitMethodTimePlot',
+             [(app.cube, start, end, app.bait_options, show_interval) for start, end in ranges]),
+        ]
+    return [repeat(f'chart[{label}]', inspect.unwrap(getattr(app, name)), arguments) for label, name, arguments in cases]
+
+
+def bench_sessions(sessions=DEFAULT_SESSIONS):
+    # 每個 session 一次 rerun 的資料路徑 (兩個 panel 的 GetProcessedData 加上 SelectDate)，
+    # 各 session 保留自己的結果，如同同時開著頁面的使用者；held_mb 為所有 session 保留結果後多佔用的記憶體
+    app = load_app()
+    ranges = random_ranges(app.dataset, sessions, seed=1)
+
+    def rerun(start_date, end_date):
+        app.GetProcessedData('panel_data_three_month.csv')
+        dataset = app.GetProcessedData('panel_data_weekly.csv')
+        return app.SelectDate(dataset, dataset.version, start_date, end_date, 0)
+
+    kept, latencies = [], []
+    for start_date, end_date in ranges:
+        start = time.perf_counter()
+        kept.append(rerun(start_date, end_date))
+        latencies.append(time.perf_counter() - start)
+    result = summarize(f'sessions[{sessions}]', latencies, sessions, sum(latencies))
+
+    # 記憶體另外量測一次 (tracemalloc 會拖慢上面的延遲)，先清掉 SelectDate 的快取讓每個 session 重新取得結果
+    app.SelectDate.clear()
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for start_date, end_date in ranges:
+        kept.append(rerun(start_date, end_date))
+    result['held_mb'] = (tracemalloc.get_traced_memory()[0] - before) / 2**20
+    tracemalloc.stop()
+    return result
+
+
+def run_case(case, args):
+    # 在獨立的 process 中執行，peak RSS 只反映這個 case
+    results = case(*args)
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results = results if isinstance(results, list) else [results]
+    for result in results:
+        result['peak_rss_mb'] = peak_rss_mb
+    return results
+
+
+def run_all(sizes):
+    # 原本的寫法很慢，只用最小的語料比較
+    cases = [(bench_score_reference, (min(sizes),))]
+    for n in sizes:
+        cases.append((bench_score_single, (n,)))
+        cases.append((bench_score_batch, (n,)))
+    cases += [(bench_load_cold, ()), (bench_load_warm, ()), (bench_select_date, ()), (bench_sessions, ()), (bench_charts, ())]
+
+    results = []
+    for case, args in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('fork')) as pool:
+            for result in pool.submit(run_case, case, args).result():
+                print_result(result)
+                results.append(result)
+    return results
+
+
+def print_result(result):
+    p50 = '-' if result['p50_ms'] is None else f"{result['p50_ms']:.3f}"
+    p99 = '-' if result['p99_ms'] is None else f"{result['p99_ms']:.3f}"
+    held = f"  held {result['held_mb']:.1f} MB" if 'held_mb' in result else ''
+    print(f"{result['case']:<32} {result['throughput']:>14,.0f}/s  p50 {p50:>10} ms  p99 {p99:>10} ms  "
+          f"peak {result['peak_rss_mb']:>8.1f} MB{held}", flush=True)
+
+
+def compare(results, baseline, tolerance):
+    # 吞吐量下降或 p99 延遲增加超過 tolerance 視為 regression
+    baseline = {result['case']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        old = baseline.get(result['case'])
+        if old is None:
+            continue
+        if result['throughput'] < old['throughput'] * (1 - tolerance):
+            regressions.append(f"{result['case']}: throughput {old['throughput']:,.0f}/s -> {result['throughput']:,.0f}/s")
+        if old['p99_ms'] and result['p99_ms'] and result['p99_ms'] > old['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{result['case']}: p99 {old['p99_ms']:.3f} ms -> {result['p99_ms']:.3f} ms")
+        # session 保留的記憶體接近 0，另外允許 1MB 的誤差
+        if 'held_mb' in old and result.get('held_mb', 0) > old['held_mb'] * (1 + tolerance) + 1:
+            regressions.append(f"{result['case']}: held {old['held_mb']:.1f} MB -> {result['held_mb']:.1f} MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='判斷引擎、資料載入與圖表彙總的 benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='假標題語料的筆數')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='比較用的 baseline 檔')
+    parser.add_argument('--save-baseline', action='store_true', help='把這次結果存成 baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允許的退步比例')
+    args = parser.parse_args(argv)
+
+    results = run_all(args.sizes)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'sizes': args.sizes, 'results': results}, f, ensure_ascii=False, indent=1)
+        print(f'baseline 已存到 {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            sys.exit(1)
+        print(f'與 {args.baseline} 相比沒有 regression')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+import os
+import pickle
+import re
+import shutil
+import unicodedata
+from itertools import chain, repeat
+
+import numpy as np
+import pandas as pd
+
+# 去重方式：global 同一則標題整個語料只算一次；press 同一則標題在每家媒體各算一次
+DEDUP_MODES = ['none', 'global', 'press']
+DEDUP_INDEX_FILE = 'dedup_index.pkl'
+# 每筆計數過的標題 (標題編號、週、媒體、類別、是否在三個月期間內)，每批資料一個 part
+TITLE_ROWS_DIR = 'title_rows'
+# build/update 進行中先把 part 寫到這裡，save 時才移入 TITLE_ROWS_DIR
+STAGED_ROWS_DIR = 'title_rows.tmp'
+# 不同的原始標題與各自的判斷結果 (bitmask)，列號即標題編號，給 app 的標題查詢使用
+TITLES_FILE = 'titles.parquet'
+
+# MinHash / LSH 參數：64 個 hash 分成 16 個 band，每個 band 4 列
+SHINGLE_SIZE = 2
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+BAND_ROWS = NUM_PERMUTATIONS // NUM_BANDS
+# 估計的 Jaccard 相似度達到這個值才視為同一則標題的改寫 (只影響計數，不影響判斷結果)；
+# 預設為 1，只合併正規化後完全相同的標題，近似重複的合併會漏算改寫過的標題，需明確指定 (例如 0.8)
+DEFAULT_SIMILARITY = 1.0
+# 計算 MinHash 時每批最多處理的 shingle 數，讓暫存陣列 (64 x 批次大小) 留在 CPU cache 中
+SHINGLE_BATCH = 8_000
+
+# multiply-shift hash：(a * x + b) 取高 32 位元，uint64 溢位即為 mod 2^64
+_rng = np.random.default_rng(20231031)
+_HASH_A = _rng.integers(0, 1 << 63, (NUM_PERMUTATIONS, 1), dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 1 << 63, (NUM_PERMUTATIONS, 1), dtype=np.uint64)
+_BAND_WEIGHTS = _rng.integers(0, 1 << 63, BAND_ROWS, dtype=np.uint64) | np.uint64(1)
+_BAND_SALTS = _rng.integers(0, 1 << 63, NUM_BANDS, dtype=np.uint64)
+_SPACES = re.compile(r'\s+')
+
+
+
+def normalize_title(title):
+    # 全形/半形統一 (NFKC)、合併空白、英文字母轉小寫，只用來決定哪些列要計數，判斷結果仍以原始標題為準
+    return _SPACES.sub(' ', unicodedata.normalize('NFKC', title)).strip().lower()
+
+
+def shingle_text(normalized):
+    # 只去掉空白；標點 (？！⋯⋯) 也是判斷方法的關鍵字，保留在 shingle 中
+    return _SPACES.sub('', normalized).ljust(SHINGLE_SIZE, '\0')
+
+
+def minhash_signatures(texts):
+    # 以字元 bigram 計算 MinHash，整批以 numpy 向量化處理，回傳 (len(texts), NUM_PERMUTATIONS) 的 uint32
+    signatures = np.empty((len(texts), NUM_PERMUTATIONS), dtype=np.uint32)
+    start = 0
+    while start < len(texts):
+        end, shingles = start, 0
+        while end < len(texts) and (end == start or shingles + len(texts[end]) <= SHINGLE_BATCH):
+            shingles += len(texts[end])
+            end += 1
+        signatures[start:end] = _minhash_batch(texts[start:end])
+        start = end
+    return signatures
+
+
+def _minhash_batch(texts):
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    counts = lengths - SHINGLE_SIZE + 1
+    text_starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    shingle_starts = np.r_[0, np.cumsum(counts)[:-1]]
+    positions = np.repeat(text_starts - shingle_starts, counts) + np.arange(counts.sum())
+
+    shingles = codes[positions]
+    for k in range(1, SHINGLE_SIZE):
+        shingles = shingles * np.uint64(0x110000) + codes[positions + k]
+    hashed = _HASH_A * shingles
+    hashed += _HASH_B
+    hashed >>= np.uint64(32)
+    return np.minimum.reduceat(hashed, shingle_starts, axis=1).T
+
+
+def band_keys(signatures):
+    # 每個 band 的 4 個 hash 合成一個整數當作 LSH bucket 的 key，加上 band 編號讓所有 band 共用一個 dict
+    bands = signatures.reshape(len(signatures), NUM_BANDS, BAND_ROWS).astype(np.uint64)
+    return ((bands * _BAND_WEIGHTS).sum(axis=2) + _BAND_SALTS).tolist()
+
+
+def prepare_titles(titles, similarity=DEFAULT_SIMILARITY):
+    # 不依賴索引狀態的部分 (正規化、MinHash、LSH key)，可以交給 worker 計算
+    # 回傳 (不重複的原始標題, 各自正規化的結果, 正規化標題 -> signature 的位置, 各正規化標題的 signature 與 band key)
+    unique = list(dict.fromkeys(titles))
+    normalized = [normalize_title(title) for title in unique]
+    positions = {text: i for i, text in enumerate(dict.fromkeys(normalized))}
+    if similarity >= 1:
+        return unique, normalized, positions, None, None
+    signatures = minhash_signatures([shingle_text(text) for text in positions])
+    return unique, normalized, positions, signatures, band_keys(signatures)
+
+
+class DedupIndex:
+    # 每個不同的原始標題各有一個標題編號、只判斷一次，bitmask 存在 masks
+    # (正規化會把「．．．」變成「...」等，改變判斷結果，所以判斷結果不能以正規化標題共用)；
+    # 正規化後相同或 MinHash 近似重複的標題歸到同一個群組 (groups)，群組只用來決定哪些列要計數
+    def __init__(self, mode='global', similarity=DEFAULT_SIMILARITY):
+        self.mode = mode
+        self.similarity = similarity
+        # 原始標題 -> 標題編號、正規化標題 -> 群組編號
+        self.exact = {}
+        self.normalized = {}
+        self.titles = []
+        # 標題編號 -> 群組編號，群組的 signature 為第一個標題的 signature
+        self.groups = []
+        self.num_groups = 0
+        self.signatures = np.empty((0, NUM_PERMUTATIONS), dtype=np.uint32)
+        # LSH bucket key -> 最近一個落在這個 bucket 的群組編號
+        self.buckets = {}
+        self.masks = np.empty(0, dtype=np.uint16)
+        self.presses = {}
+        self.counted = set()
+        # 字元的倒排索引：(字元 code << 32 | 標題編號) 排序後的陣列，涵蓋前 indexed 個標題
+        self.char_keys = np.empty(0, dtype=np.int64)
+        self.indexed = 0
+        # 逐批寫出計數過的列 (stage_rows 指定的資料夾)，記憶體不隨輸入筆數成長
+        self.rows_stage = None
+        self.staged_parts = 0
+
+    def __getstate__(self):
+        # LSH bucket 可以由 signatures 重建，不寫入檔案
+        state = self.__dict__.copy()
+        state['rows_stage'] = None
+        state['staged_parts'] = 0
+        state['buckets'] = None
+        return state
+
+    def __setstate__(self, state):
+        # 舊版的索引沒有字元倒排索引；更早的版本每個近似重複的群組只有一個標題，群組編號即標題編號
+        self.__dict__.update(state)
+        self.__dict__.pop('pending_rows', None)
+        self.__dict__.setdefault('rows_stage', None)
+        self.__dict__.setdefault('staged_parts', 0)
+        self.__dict__.setdefault('char_keys', np.empty(0, dtype=np.int64))
+        self.__dict__.setdefault('indexed', 0)
+        self.__dict__.setdefault('groups', list(range(len(self.titles))))
+        self.__dict__.setdefault('num_groups', len(self.titles))
+        if 'normalized' not in state:
+            # 舊版的 exact 以正規化標題為 key，改為以原始標題為 key；判斷結果只對已保存的原始標題有效
+            self.normalized = {text: self.groups[title_id] for text, title_id in self.exact.items()}
+            self.exact = {title: title_id for title_id, title in enumerate(self.titles)}
+        if self.buckets is None:
+            # 依群組編號順序放回，與逐一加入時一樣由最後一個群組佔住 bucket
+            keys = band_keys(self.signatures[:self.num_groups]) if self.similarity < 1 else []
+            self.buckets = dict(zip(chain.from_iterable(keys), np.repeat(np.arange(len(keys)), NUM_BANDS).tolist()))
+
+    def __len__(self):
+        return len(self.titles)
+
+    def canonicalize(self, titles, prepared=None):
+        # 回傳每個標題的標題編號，沒看過的標題會新增編號；新的正規化標題再以 MinHash 決定所屬的群組
+        unique, normalized, positions, signatures, keys = prepared or prepare_titles(titles, self.similarity)
+        if signatures is not None:
+            self._reserve(self.num_groups + len(positions))
+        for title, text in zip(unique, normalized):
+            if title in self.exact:
+                continue
+            group = self.normalized.get(text)
+            if group is None:
+                group = self.num_groups if signatures is None else \
+                    self._match_or_add(signatures[positions[text]], keys[positions[text]])
+                if group == self.num_groups:
+                    self.num_groups += 1
+                self.normalized[text] = group
+            self.exact[title] = len(self.titles)
+            self.titles.append(title)
+            self.groups.append(group)
+        return np.fromiter((self.exact[title] for title in titles), dtype=np.int64, count=len(titles))
+
+    def _reserve(self, capacity):
+        if capacity > len(self.signatures):
+            grown = np.empty((max(capacity, 2 * len(self.signatures)), NUM_PERMUTATIONS), dtype=np.uint32)
+            grown[:self.num_groups] = self.signatures[:self.num_groups]
+            self.signatures = grown
+
+    def _match_or_add(self, signature, bands):
+        # 在同一個 LSH bucket 的群組中找估計相似度最高的，達到門檻就歸到該群組，否則回傳新群組的編號 (num_groups)
+        candidates = set(map(self.buckets.get, bands))
+        candidates.discard(None)
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            agreement = (self.signatures[candidates] == signature).mean(axis=1)
+            best = agreement.argmax()
+            if agreement[best] >= self.similarity:
+                return int(candidates[best])
+        # 只有群組的第一個標題放進 bucket，避免改寫一再累積後偏離原本的標題
+        self.signatures[self.num_groups] = signature
+        self.buckets.update(zip(bands, repeat(self.num_groups)))
+        return self.num_groups
+
+    def claim(self, title_ids, presses):
+        # 回傳要計數的列：global 每個群組只算第一次出現，press 每家媒體各算第一次出現
+        groups = [self.groups[i] for i in title_ids.tolist()]
+        if self.mode == 'global':
+            keys = groups
+        else:
+            codes = [self.presses.setdefault(press, len(self.presses)) for press in presses]
+            keys = list(zip(groups, codes))
+        keep = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            if key not in self.counted:
+                self.counted.add(key)
+                keep[i] = True
+        return keep
+
+    def take_unscored(self):
+        # 還沒判斷過的標題 (編號從 start 開始)
+        start = len(self.masks)
+        self.masks = np.concatenate([self.masks, np.zeros(len(self.titles) - start, dtype=np.uint16)])
+        return start, self.titles[start:]
+
+    def set_masks(self, start, masks):
+        self.masks[start:start + len(masks)] = masks
+
+    def stage_rows(self, out_dir):
+        # 開始 build/update 前呼叫，清掉上次中斷留下的 part
+        self.rows_stage = os.path.join(out_dir, STAGED_ROWS_DIR)
+        shutil.rmtree(self.rows_stage, ignore_errors=True)
+        os.makedirs(self.rows_stage)
+        self.staged_parts = 0
+
+    def record_rows(self, title_ids, dates, days, presses, categories, in_window):
+        # Date 為該週星期一，Day 為發布日 (分割的每日 panel 用)；每批直接寫成一個 part，不留在記憶體中
+        if not len(title_ids):
+            return
+        rows = pd.DataFrame({'TitleId': title_ids, 'Date': dates, 'Day': days, 'Press': presses,
+                             'Category': categories, 'InWindow': in_window})
+        for column in ['Press', 'Category']:
+            rows[column] = rows[column].astype('category')
+        rows.to_parquet(os.path.join(self.rows_stage, f'part-{self.staged_parts:05d}.parquet'), index=False)
+        self.staged_parts += 1
+
+    def load_rows(self, out_dir):
+        path = os.path.join(out_dir, TITLE_ROWS_DIR)
+        if not os.path.isdir(path) or not os.listdir(path):
+            return pd.DataFrame(columns=['TitleId', 'Date', 'Day', 'Press', 'Category', 'InWindow'])
+        return pd.read_parquet(path)
+
+    def index_chars(self):
+        # 把還沒建索引的標題加入字元倒排索引
+        titles = self.titles[self.indexed:]
+        if not titles:
+            return
+        lengths = np.fromiter(map(len, titles), dtype=np.int64, count=len(titles))
+        codes = np.frombuffer(''.join(titles).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        ids = np.repeat(np.arange(self.indexed, len(self.titles), dtype=np.int64), lengths)
+        keys = np.unique((codes << 32) | ids)
+        self.char_keys = np.sort(np.concatenate([self.char_keys, keys]), kind='stable')
+        self.indexed = len(self.titles)
+
+    def titles_with_char(self, char):
+        code = ord(char)
+        lo, hi = np.searchsorted(self.char_keys, [code << 32, (code + 1) << 32])
+        return self.char_keys[lo:hi] & 0xFFFFFFFF
+
+    def titles_containing(self, words):
+        # 用字元倒排索引找出含有任一個字詞的標題：先取各字元 posting list 的交集，再確認字詞確實出現
+        found = [np.empty(0, dtype=np.int64)]
+        for word in words:
+            postings = sorted((self.titles_with_char(char) for char in set(word)), key=len)
+            candidates = postings[0] if postings else np.empty(0, dtype=np.int64)
+            for posting in postings[1:]:
+                candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if len(word) > 1:
+                candidates = candidates[[word in self.titles[i] for i in candidates]].astype(np.int64)
+            found.append(candidates)
+        return np.unique(np.concatenate(found))
+
+    def save(self, out_dir):
+        if self.rows_stage is not None:
+            # 這次 build/update 的 part 接在既有的 part 之後
+            rows_dir = os.path.join(out_dir, TITLE_ROWS_DIR)
+            os.makedirs(rows_dir, exist_ok=True)
+            first = len(os.listdir(rows_dir))
+            for part in range(self.staged_parts):
+                os.replace(os.path.join(self.rows_stage, f'part-{part:05d}.parquet'),
+                           os.path.join(rows_dir, f'part-{first + part:05d}.parquet'))
+            shutil.rmtree(self.rows_stage)
+            self.rows_stage = None
+        self.index_chars()
+        titles_path = os.path.join(out_dir, TITLES_FILE)
+        pd.DataFrame({'Title': self.titles, 'Mask': self.masks}).to_parquet(titles_path + '.tmp', index=False)
+        os.replace(titles_path + '.tmp', titles_path)
+        path = os.path.join(out_dir, DEDUP_INDEX_FILE)
+        self.signatures = self.signatures[:self.num_groups]
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+
+def load_dedup_index(out_dir, mode, similarity=DEFAULT_SIMILARITY):
+    path = os.path.join(out_dir, DEDUP_INDEX_FILE)
+    if not os.path.exists(path):
+        return DedupIndex(mode, similarity)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
@@ -0,0 +1,86 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 圖表快取的記憶體上限 (MB)，可用環境變數調整
+DEFAULT_MAX_MB = float(os.environ.get('CLICKBAIT_FIGURE_CACHE_MB', 64))
+
+
+def freeze(value):
+    # 把 list 等參數轉成可當 dict key 的 tuple
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+def estimate_size(value):
+    # 估計 figure 內容佔用的位元組數：數值陣列用 nbytes，object 陣列每格以 16 bytes 計，不需把整個 figure 序列化
+    if isinstance(value, np.ndarray):
+        return value.nbytes if value.dtype != object else 16 * value.size
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    return 8
+
+
+def figure_size(figure):
+    # 直接走訪 figure 內部的 trace 與 layout 屬性 (不複製)；所有圖表共用的 template 不計入
+    layout = {key: value for key, value in figure._layout.items() if key != 'template'}
+    return estimate_size(figure._data) + estimate_size(layout)
+
+
+class FigureCache:
+    # 以 (圖表, 資料版本, 篩選條件) 為 key 的 LRU 快取，超過記憶體上限時淘汰最久沒用到的圖表
+    def __init__(self, max_mb=DEFAULT_MAX_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return self._figures[key][0]
+            self.misses += 1
+
+        # 在 lock 外建立圖表，避免擋住其他 session
+        figure = build()
+        size = figure_size(figure)
+        with self._lock:
+            if key in self._figures:
+                self.total_bytes -= self._figures.pop(key)[1]
+            self._figures[key] = (figure, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self._figures) > 1:
+                self.total_bytes -= self._figures.popitem(last=False)[1][1]
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.total_bytes = 0
+
+
+# 整個 process 共用一份，所有 session 都能使用已建立的圖表
+figure_cache = FigureCache()
+
+
+def cached_figure(chart):
+    # chart(cube, *selections) 必須只依賴參數產生圖表，且呼叫端不可修改回傳的 figure
+    @functools.wraps(chart)
+    def wrapper(cube, *args):
+        key = (chart.__name__, cube.version, *(freeze(arg) for arg in args))
+        return figure_cache.get_or_build(key, lambda: chart(cube, *args))
+    return wrapper
@@ -1,45 +1,136 @@
+import json
+import os
+
+import numpy as np
 import pandas as pd
 import re
 
-def criterion_1(title):
-    # 要搜索的中文字列表
-    target_characters = ["他", "她", "它", "他們", "她們", "它們", "祂", "牠", "你", "妳", "這"]
-    if any(target_character in title for target_character in target_characters):
-        return 1
-    else:
-        return 0
-    
-def criterion_2(title):
-    # 要搜索的中文字列表
-    target_characters = ["崩", "砲", "瘋", "扯", "狂", "激", "慘", "笑", "哭", "酸", "諷", "神", "猛", "讚", "嗆", "轟", "罵", "怒", "怒斥", "冷回", "飆罵", "怒批", "痛批", "打臉", "譴責"]
-    if any(target_character in title for target_character in target_characters):
-        return 1
-    else:
-        return 0
-    
-def criterion_3(title):
-    # Check if the title contains two or more of the specified characters ('!', '?', '！', '？')
-    if len(re.findall(r'[!？！?]', title)) >= 2:
-        return 1
-    else:
-        return 0
-    
-def criterion_4(title):
-    # target_characters = r'\b(?!驚天|驚訝|辯才|人才|步步驚心|專才|育才|武嚇|才是|恐嚇)\b(居然|竟然|竟|甚至|甚而|反而|反倒|原來|未料|不料|想不到|沒想到|才|卻|驚)'
-    target_characters = r'(?!驚天|驚訝|辯才|人才|步步驚心|專才|育才|武嚇|才是|恐嚇)(居然|竟然|竟|甚至|甚而|反而|反倒|原來|未料|不料|想不到|沒想到|才|卻|驚)'
-    match = re.search(target_characters, title)
-    if match:
-        return 1
-    else:
-        return 0
-    
-def criterion_5(title):
-    # 要搜索的中文字列表
-    target_characters = ["⋯⋯", "⋯", "...", "…"]
-    if any(target_character in title for target_character in target_characters):
-        return 1
-    else:
-        return 0
+import profiling
+
+# 判斷規則 (各判斷方法的關鍵字、排除字、標點與量詞) 放在有版本號的規則檔，可用環境變數指定其他規則檔
+RULES_PATH = os.environ.get('CLICKBAIT_RULES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clickbait_rules.json'))
+
+NUM_CRITERIA = 15
+
+
+def criterion_bit(n):
+    return 1 << (n - 1)
+
+
+# score_titles 輸出的欄位名稱，前 14 個與 panel data 的釣魚方法欄位相同
+CRITERIA_COLUMNS = ['forward-referencing', 'emotional', 'interrogative', 'surprise', 'ellipsis', 'list', 'how_to',
+                    'interjection', 'spillthebeans', 'gossip', 'ending_words', 'netizen', 'exaggerated', 'uncertainty',
+                    'mild_interrogative']
+# 標題出現量詞時才需要再跑清單式的判斷
+_LIST_CANDIDATE_BIT = 1 << NUM_CRITERIA
+
+
+def _build_token_masks():
+    # 每個 token 對應一個 bitmask：在同一個位置上，所有是這個 token 前綴的關鍵字都會一起成立
+    vocabulary = set(PUNCTUATION_MARKS) | set(LIST_QUANTIFIERS)
+    for words in KEYWORD_CRITERIA.values():
+        vocabulary.update(words)
+    for words, excluded in LOOKAHEAD_CRITERIA.values():
+        vocabulary.update(words)
+        vocabulary.update(excluded)
+
+    token_masks = {}
+    for token in vocabulary:
+        prefixes = {word for word in vocabulary if token.startswith(word)}
+        mask = 0
+        for n, words in KEYWORD_CRITERIA.items():
+            if prefixes.intersection(words):
+                mask |= criterion_bit(n)
+        for n, (words, excluded) in LOOKAHEAD_CRITERIA.items():
+            if prefixes.intersection(words) and not prefixes.intersection(excluded):
+                mask |= criterion_bit(n)
+        if prefixes.intersection(PUNCTUATION_MARKS):
+            mask |= criterion_bit(15)
+        if prefixes.intersection(LIST_QUANTIFIERS):
+            mask |= _LIST_CANDIDATE_BIT
+        token_masks[token] = mask
+    return token_masks
+
+
+def _trie_pattern(words):
+    # 把關鍵字組成 trie 形式的 regex，同一位置會優先比對到最長的關鍵字
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+def load_rules(path=RULES_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def use_rules(rules):
+    # 套用一份規則，重建每個 token 的 bitmask 與 scanner
+    global RULES, KEYWORD_CRITERIA, LOOKAHEAD_CRITERIA, PUNCTUATION_MARKS, LIST_QUANTIFIERS, STRONG_CRITERIA, STRONG_MASK
+    global _TOKEN_MASKS, _SCANNER
+    RULES = rules
+    # 各判斷方法的關鍵字：criterion 編號 -> 要搜索的中文字列表
+    KEYWORD_CRITERIA = {int(n): words for n, words in rules['keyword_criteria'].items()}
+    # 有排除字的判斷方法：criterion 編號 -> (關鍵字, 同位置出現時要排除的字)
+    # 等同於原本的 r'(?!排除字)(關鍵字)' 寫法
+    LOOKAHEAD_CRITERIA = {int(n): (rule['keywords'], rule['excluded']) for n, rule in rules['lookahead_criteria'].items()}
+    # 問題式 (criterion 3 需兩個以上、criterion 15 需一個以上)
+    PUNCTUATION_MARKS = rules['punctuation_marks']
+    # 清單式 (criterion 6) 的量詞，依規則檔的順序檢查 (第一個符合的量詞決定結果，不可用 set)
+    LIST_QUANTIFIERS = tuple(rules['list_quantifiers'])
+    # 根據論文研究結果 1,3,5,7,8,9,12 較具判斷力，符合一項即判定為釣餌式標題
+    STRONG_CRITERIA = rules['strong_criteria']
+    STRONG_MASK = sum(criterion_bit(n) for n in STRONG_CRITERIA)
+
+    _TOKEN_MASKS = _build_token_masks()
+    # 用 lookahead 包起來，讓 findall 在每個位置都回報最長的關鍵字（可重疊）
+    _SCANNER = re.compile("(?=(" + _trie_pattern(_TOKEN_MASKS) + "))")
+
+
+def _criterion_words(rules, n):
+    # 某個判斷方法在規則中的 (關鍵字, 排除字)
+    if str(n) in rules['lookahead_criteria']:
+        rule = rules['lookahead_criteria'][str(n)]
+        return set(rule['keywords']), set(rule['excluded'])
+    return set(rules['keyword_criteria'].get(str(n), [])), set()
+
+
+def rule_changes(old, new):
+    # 比較兩份規則，回傳 (受影響的判斷方法 bitmask, 需要重新判斷的字詞, 強判斷方法是否改變)
+    # 每個判斷方法的結果只取決於自己的字詞，沒有出現這些字詞的標題結果不變
+    changed, words = 0, set()
+    for n in range(1, NUM_CRITERIA + 1):
+        old_words, old_excluded = _criterion_words(old, n)
+        new_words, new_excluded = _criterion_words(new, n)
+        diff = (old_words ^ new_words) | (old_excluded ^ new_excluded)
+        if diff:
+            changed |= criterion_bit(n)
+            words |= diff
+    if set(old['punctuation_marks']) != set(new['punctuation_marks']):
+        changed |= criterion_bit(3) | criterion_bit(15)
+        words |= set(old['punctuation_marks']) ^ set(new['punctuation_marks'])
+    if old['list_quantifiers'] != new['list_quantifiers']:
+        # 量詞的檢查順序也會影響結果，有任何量詞的標題都要重新判斷
+        changed |= criterion_bit(6)
+        words |= set(old['list_quantifiers']) | set(new['list_quantifiers'])
+    return changed, words, set(old['strong_criteria']) != set(new['strong_criteria'])
+
+
+use_rules(load_rules())
+
+
 def chinese_to_arabic(chinese_number):
     chinese_number_map = {
         '一': 1, '二': 2, '三': 3, '四': 4, '五': 5,
@@ -55,14 +146,14 @@ def chinese_to_arabic(chinese_number):
 
     return chinese_number
 
-def criterion_6(news_title):
+
+def _has_list_quantifier(news_title):
     news_title = chinese_to_arabic(news_title)
-    quantifiers = {"個", "種", "項", "位", "張", "大", "招"}
 
     # 空白去除
     title_without_spaces = "".join(news_title.split())
 
-    for quantifier in quantifiers:
+    for quantifier in LIST_QUANTIFIERS:
         if quantifier in title_without_spaces:
             try:
                 if quantifier == "個":
@@ -81,90 +172,153 @@ def criterion_6(news_title):
                 pass
     return 0
 
-def criterion_7(title):
-    # 要搜索的中文字列表
-    target_characters = ["如何", "該怎麼做", "該如何"]
-    if any(target_character in title for target_character in target_characters):
+
+def match_criteria(title):
+    # 掃描標題一次，回傳 15 個判斷方法的 bitmask (第 n 個 bit 代表 criterion_n)
+    tokens = _SCANNER.findall(title)
+    mask = 0
+    for token in tokens:
+        mask |= _TOKEN_MASKS[token]
+    if mask & criterion_bit(15):
+        # 直接從標題計數：tokens 每個位置只有最長的關鍵字，以標點開頭的關鍵字 (例如「!!」) 會蓋過標點本身
+        if sum(title.count(mark) for mark in PUNCTUATION_MARKS) >= 2:
+            mask |= criterion_bit(3)
+    if mask & _LIST_CANDIDATE_BIT:
+        mask ^= _LIST_CANDIDATE_BIT
+        if _has_list_quantifier(title):
+            mask |= criterion_bit(6)
+    return mask
+
+
+def criteria_flags(mask):
+    return [(mask >> i) & 1 for i in range(NUM_CRITERIA)]
+
+
+def mask_is_clickbait(mask):
+    if mask & STRONG_MASK:
         return 1
-    else:
-        return 0
-    
-def criterion_8(title):
-    # 要搜索的中文字列表
-    target_characters = ["嗯", "哎", "咦", "啊", "唉", "呦"]
-    if any(target_character in title for target_character in target_characters):
+    elif bin(mask).count("1") >= 2:
         return 1
     else:
         return 0
 
+
+def criterion_1(title):
+    return (match_criteria(title) >> 0) & 1
+
+def criterion_2(title):
+    return (match_criteria(title) >> 1) & 1
+
+def criterion_3(title):
+    # Check if the title contains two or more of the specified characters ('!', '?', '！', '？')
+    return (match_criteria(title) >> 2) & 1
+
+def criterion_4(title):
+    return (match_criteria(title) >> 3) & 1
+
+def criterion_5(title):
+    return (match_criteria(title) >> 4) & 1
+
+def criterion_6(news_title):
+    return (match_criteria(news_title) >> 5) & 1
+
+def criterion_7(title):
+    return (match_criteria(title) >> 6) & 1
+
+def criterion_8(title):
+    return (match_criteria(title) >> 7) & 1
+
 # 爆料文體
 def criterion_9(title):
-    # 要搜索的中文字列表
-    target_characters = ["曝光", "自爆", "爆料", "再爆"]
-    if any(target_character in title for target_character in target_characters):
-        return 1
-    else:
-        return 0
+    return (match_criteria(title) >> 8) & 1
 
 # 八卦文體
 def criterion_10(title):
-    # 要搜索的中文字列表
-    target_characters = ["正妹", "美女", "老司機", "傻眼", "性感", "辣", "小模", "女神", "嫩", "甜美", "型男", "嘟嘴", "寶寶", "可愛"]
-    # 如果標題中包含指定的任一關鍵字，返回 True，否則返回 False
-    if any(target_character in title for target_character in target_characters):
-        return 1
-    else:
-        return 0
+    return (match_criteria(title) >> 9) & 1
 
 # 句尾詞「了」
 def criterion_11(title):
-    if re.search(r'了', title):
-        return 1
-    # 如果以上條件都不符合，返回 False
-    return 0
+    return (match_criteria(title) >> 10) & 1
 
 # 群眾效果
 def criterion_12(title):
     # 如果標題中包含 '網'，但不包含 '網路' 和 '網站'，返回 True
-    if re.search(r'網(?!路|站|銀)', title):
-        return 1
-    # 如果以上條件都不滿足，返回 False
-    return 0
+    return (match_criteria(title) >> 11) & 1
 
 # 誇大
 def criterion_13(title):
-    target_characters = ["最", "太", "狠", "極其", "更加", "非常", "格外", "越加", "神", "狂", "超"]
-    # 如果標題中包含指定的任一關鍵字，返回 True，否則返回 False
-    if any(target_character in title for target_character in target_characters):
-        return 1
-    else:
-        return 0
+    return (match_criteria(title) >> 12) & 1
 
 # 不確定性
 def criterion_14(title):
-    target_characters = r'(?!宣傳|傳統|傳奇|傳遞|頻傳|銘傳|傳訊|傳喚|傳承|遠傳|傳記|驚恐|恐嚇|恐怖|唯恐天下不亂|質疑|遲疑|疑點|疑惑)(傳|瘋傳|轉傳|網傳|誤傳|疑|恐)'
-
-    match = re.search(target_characters, title)
+    return (match_criteria(title) >> 13) & 1
 
-    if match:
-        return 1
-    else:
-        return 0
 #微疑問
 def criterion_15(title):
-    # Check if the title contains two or more of the specified characters ('!', '?', '！', '？')
-    if len(re.findall(r'[!？！?]', title)) >= 1:
-        return 1
-    else:
-        return 0
-    
+    # Check if the title contains one or more of the specified characters ('!', '?', '！', '？')
+    return (match_criteria(title) >> 14) & 1
+
 # 定義誘餌式標題判斷函數
 def is_clickbait(title):
-    criteria_results = [criterion_1(title), criterion_2(title), criterion_3(title), criterion_4(title), criterion_5(title), criterion_6(title), criterion_7(title), criterion_8(title), criterion_9(title), criterion_10(title), criterion_11(title), criterion_12(title), criterion_13(title), criterion_14(title),criterion_15(title)]
-    print(criteria_results)
-    if criterion_1(title) or criterion_3(title) or criterion_5(title) or criterion_7(title) or criterion_8(title) or criterion_9(title) or criterion_12(title) == 1:
-        return 1
-    elif sum(criteria_results) >= 2:
-        return 1
-    else:
-        return 0
\ No newline at end of file
+    return mask_is_clickbait(match_criteria(title))
+
+
+# 批次判斷：回傳每個標題的 bitmask (uint16)
+def title_masks(titles):
+    titles = pd.Series(titles, copy=False)
+    # 重複的標題只掃描一次
+    codes, uniques = pd.factorize(titles.fillna("").astype(str))
+    unique_masks = np.fromiter((match_criteria(title) for title in uniques), dtype=np.uint16, count=len(uniques))
+    return unique_masks[codes]
+
+
+# 把 bitmask 展開成 15 個判斷方法 (uint8) 與 IsClickbait (bool) 的 DataFrame
+def scores_from_masks(masks, index=None, strong_mask=None):
+    strong_mask = STRONG_MASK if strong_mask is None else strong_mask
+    masks = np.asarray(masks, dtype=np.uint16)
+    flags = ((masks[:, None] >> np.arange(NUM_CRITERIA, dtype=np.uint16)) & 1).astype(np.uint8)
+    result = pd.DataFrame(flags, columns=CRITERIA_COLUMNS, index=index)
+    result['IsClickbait'] = ((masks & strong_mask) != 0) | (flags.sum(axis=1) >= 2)
+    return result
+
+
+# 批次判斷：回傳每個標題 15 個判斷方法 (uint8) 與 IsClickbait (bool) 的 DataFrame
+def score_titles(titles):
+    titles = pd.Series(titles, copy=False)
+    return scores_from_masks(title_masks(titles), titles.index)
+
+
+# 各判斷方法的命中次數 (需開啟 CLICKBAIT_PROFILE 才會記錄)
+_titles_scanned = 0
+_criterion_hits = [0] * NUM_CRITERIA
+
+
+def criterion_stats():
+    # 所有判斷方法共用同一次掃描 (is_clickbait.scan)，只有清單式另外計時 (criterion_6.list_check)
+    stats = {row['stage']: row for row in profiling.stage_stats()}
+    scan_ms = stats.get('is_clickbait.scan', {}).get('total_ms', 0.0)
+    list_ms = stats.get('criterion_6.list_check', {}).get('total_ms', 0.0)
+    return [{
+        'criterion': n,
+        'column': CRITERIA_COLUMNS[n - 1],
+        'calls': _titles_scanned,
+        'hits': _criterion_hits[n - 1],
+        'hit_rate': _criterion_hits[n - 1] / _titles_scanned if _titles_scanned else 0.0,
+        'extra_ms': list_ms if n == 6 else 0.0,
+        'shared_scan_ms': scan_ms,
+    } for n in range(1, NUM_CRITERIA + 1)]
+
+
+if profiling.ENABLED:
+    _scan_criteria = match_criteria
+    _has_list_quantifier = profiling.timed(_has_list_quantifier, name='criterion_6.list_check')
+
+    def match_criteria(title):
+        global _titles_scanned
+        with profiling.stage('is_clickbait.scan'):
+            mask = _scan_criteria(title)
+        _titles_scanned += 1
+        for i in range(NUM_CRITERIA):
+            if mask >> i & 1:
+                _criterion_hits[i] += 1
+        return mask
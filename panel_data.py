@@ -0,0 +1,177 @@
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# panel data 中的計數欄位 (其餘數值欄位為 processed_data 的比例)
+COUNT_COLUMNS = ['Count_News', 'IsClickbait', 'forward-referencing', 'emotional', 'interrogative', 'surprise', 'ellipsis',
+                 'list', 'how_to', 'interjection', 'spillthebeans', 'gossip', 'ending_words', 'netizen', 'exaggerated',
+                 'uncertainty']
+FIRST_DATE = date(2017, 12, 31)
+# 95% 信賴區間的 z 值
+INTERVAL_Z = 1.959963984540054
+
+
+def cache_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def read_panel_csv(csv_path):
+    # 把 CSV 轉成有型別的欄位：datetime64 的 Date、category 的 Press/Category、整數的計數
+    df = pd.read_csv(csv_path, index_col=0)
+    for column in ['Press', 'Category']:
+        df[column] = df[column].astype('category')
+    for column in COUNT_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(np.int32)
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date'])
+        df = df[df['Date'] > pd.Timestamp(FIRST_DATE)]
+        df = df.sort_values(by='Date', kind='stable')
+    return df.reset_index(drop=True)
+
+
+def build_cache(csv_path):
+    df = read_panel_csv(csv_path)
+    path = cache_path(csv_path)
+    df.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    return df
+
+
+def load_panel(csv_path):
+    # 讀取 parquet 快取，CSV 比快取新 (或還沒有快取) 時才重建
+    path = cache_path(csv_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path):
+        return pd.read_parquet(path)
+    return build_cache(csv_path)
+
+
+class PanelCube:
+    # Press x Category x 時間 的彙總 cube，時間軸上存累加值，任何日期區間都只需兩次 searchsorted 與一次相減
+    def __init__(self, df, version=None):
+        self.version = version
+        self.presses = np.array(sorted(df['Press'].unique()), dtype=object)
+        self.categories = np.array(sorted(df['Category'].unique()), dtype=object)
+        press_index = np.searchsorted(self.presses, df['Press'].astype(str).to_numpy())
+        category_index = np.searchsorted(self.categories, df['Category'].astype(str).to_numpy())
+        if 'Date' in df.columns:
+            self.dates = np.unique(df['Date'].to_numpy())
+            time_index = np.searchsorted(self.dates, df['Date'].to_numpy())
+            months = self.dates.astype('datetime64[M]')
+            # 每個月第一個時間點的位置
+            self.month_starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+            self.months = months[self.month_starts]
+        else:
+            # 沒有 Date 的 panel (三個月分析) 只有一個時間點
+            self.dates = None
+            time_index = np.zeros(len(df), dtype=np.intp)
+        periods = 1 if self.dates is None else len(self.dates)
+
+        cells = np.zeros((len(self.presses), len(self.categories), periods + 1, len(COUNT_COLUMNS)), dtype=np.int64)
+        np.add.at(cells, (press_index, category_index, time_index + 1), df[COUNT_COLUMNS].to_numpy(np.int64))
+        self.cumulative = cells.cumsum(axis=2)
+
+    def date_range(self, start_date=None, end_date=None):
+        # 回傳 [lo, hi) 的時間位置，包含 start_date 與 end_date
+        if self.dates is None:
+            return 0, 1
+        lo = 0 if start_date is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start_date)), 'left')
+        hi = len(self.dates) if end_date is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end_date)), 'right')
+        return lo, max(lo, hi)
+
+    def first_date(self, start_date=None, end_date=None):
+        lo, hi = self.date_range(start_date, end_date)
+        return pd.Timestamp(self.dates[lo]) if hi > lo else None
+
+    def summarize(self, by, start_date=None, end_date=None, presses=None, categories=None, monthly=False):
+        # 等同於「篩選日期/媒體/類別後 groupby(by (+ MonthYear)) 加總」，只留下有資料的組合
+        lo, hi = self.date_range(start_date, end_date)
+        if monthly:
+            starts = np.clip(self.month_starts, lo, hi)
+            ends = np.clip(np.r_[self.month_starts[1:], len(self.dates)], lo, hi)
+            values = self.cumulative[:, :, ends] - self.cumulative[:, :, starts]
+            month_labels = np.datetime_as_string(self.months, unit='M')
+        else:
+            values = (self.cumulative[:, :, hi] - self.cumulative[:, :, lo])[:, :, np.newaxis]
+            month_labels = None
+
+        press_labels, category_labels = self.presses, self.categories
+        if presses is not None:
+            mask = np.isin(self.presses, list(presses))
+            values, press_labels = values[mask], press_labels[mask]
+        if categories is not None:
+            mask = np.isin(self.categories, list(categories))
+            values, category_labels = values[:, mask], category_labels[mask]
+
+        levels = []
+        if 'Press' in by:
+            levels.append(('Press', press_labels))
+        else:
+            values = values.sum(axis=0, keepdims=True)
+        if 'Category' in by:
+            levels.append(('Category', category_labels))
+        else:
+            values = values.sum(axis=1, keepdims=True)
+        if monthly:
+            levels.append(('MonthYear', month_labels))
+
+        values = values.reshape(-1, len(COUNT_COLUMNS))
+        if levels:
+            index = pd.MultiIndex.from_product([labels for _, labels in levels], names=[name for name, _ in levels])
+        else:
+            index = pd.RangeIndex(len(values))
+        result = pd.DataFrame(values, index=index, columns=COUNT_COLUMNS)
+        result = result[result['Count_News'] > 0]
+        return result.reset_index() if levels else result.reset_index(drop=True)
+
+
+def wilson_interval(successes, trials, z=INTERVAL_Z):
+    # 二項比例的 Wilson 信賴區間 (下界, 上界)，輸入可以是任意形狀的陣列，所有格子一次算完；trials 為 0 的格子為 nan
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = successes / trials
+        scale = 1 + z * z / trials
+        center = (ratio + z * z / (2 * trials)) / scale
+        margin = z * np.sqrt(ratio * (1 - ratio) / trials + z * z / (4 * trials * trials)) / scale
+    # 浮點誤差可能讓 0 或 1 附近的界限稍微超出 [0, 1] 或越過比例本身 (error bar 長度會變成負的)
+    return np.minimum(np.maximum(center - margin, 0), ratio), np.maximum(np.minimum(center + margin, 1), ratio)
+
+
+def dataset_version(csv_path):
+    # 用檔案的修改時間與大小當作資料版本，檔案更新後版本就會改變
+    stat = os.stat(csv_path)
+    return f'{stat.st_mtime_ns}-{stat.st_size}'
+
+
+class PanelDataset:
+    # 所有 session 共用的唯讀資料：panel frame、cube 與資料版本，使用端不可修改 frame
+    def __init__(self, csv_path):
+        self.path = csv_path
+        self.version = dataset_version(csv_path)
+        self.frame = load_panel(csv_path)
+        self.cube = PanelCube(self.frame, self.version)
+        # 側邊欄的預設值 (三個月 panel 沒有 Date)
+        dates = self.frame['Date'] if 'Date' in self.frame.columns else pd.Series(dtype='datetime64[ns]')
+        self.start_date = dates.min()
+        self.end_date = dates.max()
+        self.presses = self.frame['Press'].unique().tolist()
+        self.categories = self.frame['Category'].unique().tolist()
+
+    def date_bounds(self, start_date, end_date):
+        # frame 已依 Date 排序，用 searchsorted 取區間的列位置
+        lo = self.frame['Date'].searchsorted(pd.Timestamp(start_date), 'left')
+        hi = self.frame['Date'].searchsorted(pd.Timestamp(end_date), 'right')
+        return lo, hi
+
+    def count_rows(self, start_date, end_date):
+        lo, hi = self.date_bounds(start_date, end_date)
+        return max(hi - lo, 0)
+
+    def select_date(self, start_date, end_date, offset=0, limit=None):
+        # 區間內第 offset 列起的 limit 列 (limit 為 None 時取到區間結尾)；回傳的是 slice，不複製資料
+        lo, hi = self.date_bounds(start_date, end_date)
+        lo = min(lo + offset, hi)
+        return self.frame.iloc[lo:hi if limit is None else min(hi, lo + limit)]
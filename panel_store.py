@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from panel_data import COUNT_COLUMNS
+
+# 分割後的 panel：每個 (月份, 媒體) 一個 parquet 檔，欄位為 Date, Category 與計數欄位
+# manifest 記錄每個分割的日期範圍與各類別的合計，整個月都在查詢範圍內的分割不需讀檔
+STORE_MANIFEST = 'partitions.json'
+PARTITION_COLUMNS = ['Date', 'Category', *COUNT_COLUMNS]
+
+
+def partition_key(month, press):
+    return f'{month}/{press}'
+
+
+def partition_file(month, press):
+    return os.path.join(f'month={month}', f'press={quote(press, safe="")}.parquet')
+
+
+def load_store_manifest(root):
+    path = os.path.join(root, STORE_MANIFEST)
+    if not os.path.exists(path):
+        return {'version': 0, 'partitions': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_store_manifest(manifest, root):
+    path = os.path.join(root, STORE_MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def clear_store(root):
+    # 只刪除分割與 manifest，資料夾中的其他檔案不動
+    manifest = load_store_manifest(root)
+    for partition in manifest['partitions'].values():
+        path = os.path.join(root, partition['path'])
+        if os.path.exists(path):
+            os.remove(path)
+        if os.path.isdir(os.path.dirname(path)) and not os.listdir(os.path.dirname(path)):
+            os.rmdir(os.path.dirname(path))
+    if os.path.exists(os.path.join(root, STORE_MANIFEST)):
+        os.remove(os.path.join(root, STORE_MANIFEST))
+
+
+def write_partition(frame, root, month, press):
+    # frame 為單一 (月份, 媒體) 的資料，依 (Date, Category) 加總、排序後寫入，回傳 manifest 中的分割資訊
+    summed = frame.groupby(['Date', 'Category'], observed=True)[COUNT_COLUMNS].sum()
+    summed = summed[summed['Count_News'].to_numpy() != 0]
+    values = summed.to_numpy(np.int64)
+    dates, categories = summed.index.get_level_values(0), summed.index.get_level_values(1).astype(str)
+    table = pd.DataFrame(values, columns=COUNT_COLUMNS)
+    table.insert(0, 'Category', categories)
+    table.insert(0, 'Date', dates)
+    relative = partition_file(month, press)
+    path = os.path.join(root, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    # 各類別的合計，整月都在查詢範圍內時直接使用
+    codes, labels = pd.factorize(categories, sort=True)
+    totals = np.zeros((len(labels), len(COUNT_COLUMNS)), dtype=np.int64)
+    np.add.at(totals, codes, values)
+    return {
+        'month': month,
+        'press': press,
+        'path': relative,
+        'rows': len(table),
+        'min_date': dates.min().strftime('%Y-%m-%d') if len(table) else None,
+        'max_date': dates.max().strftime('%Y-%m-%d') if len(table) else None,
+        'totals': dict(zip(labels, totals.tolist())),
+    }
+
+
+def merge_partitions(counts, root):
+    # 把 (Date, Press, Category, 計數) 併入分割，只改寫有新資料的 (月份, 媒體)；計數可以是負的差額
+    if counts.empty:
+        return []
+    os.makedirs(root, exist_ok=True)
+    manifest = load_store_manifest(root)
+    counts = counts.copy()
+    counts['Date'] = pd.to_datetime(counts['Date']).dt.normalize()
+    counts['Category'] = counts['Category'].astype(str)
+    counts['Month'] = counts['Date'].dt.strftime('%Y-%m')
+    touched = []
+    for (month, press), new in counts.groupby(['Month', counts['Press'].astype(str)], sort=True):
+        key = partition_key(month, press)
+        frame = new[PARTITION_COLUMNS]
+        if key in manifest['partitions']:
+            frame = pd.concat([pd.read_parquet(os.path.join(root, manifest['partitions'][key]['path'])), frame])
+        manifest['partitions'][key] = write_partition(frame, root, month, press)
+        touched.append(key)
+    manifest['version'] += 1
+    save_store_manifest(manifest, root)
+    return touched
+
+
+def store_version(root):
+    # manifest 每次合併都會改寫，用它的修改時間與大小當作資料版本；沒有分割的 panel 時回傳 None
+    path = os.path.join(root, STORE_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return f'{stat.st_mtime_ns}-{stat.st_size}'
+
+
+class PartitionedPanel:
+    # 與 PanelCube 相同的查詢介面 (summarize / first_date / version)，但資料留在磁碟上：
+    # 依日期與媒體篩選分割，整月都在範圍內的分割直接用 manifest 的合計，只有頭尾的月份需要讀檔，邊讀邊加總
+    def __init__(self, root):
+        self.root = root
+        manifest = load_store_manifest(root)
+        self.version = store_version(root)
+        self.partitions = sorted((p for p in manifest['partitions'].values() if p['rows']), key=lambda p: (p['month'], p['press']))
+        self.presses = np.array(sorted({p['press'] for p in self.partitions}), dtype=object)
+        self.categories = np.array(sorted({c for p in self.partitions for c in p['totals']}), dtype=object)
+
+    def min_date(self):
+        return min((pd.Timestamp(p['min_date']) for p in self.partitions), default=None)
+
+    def max_date(self):
+        return max((pd.Timestamp(p['max_date']) for p in self.partitions), default=None)
+
+    def select(self, start_date=None, end_date=None, presses=None):
+        # 分割的篩選下推：只留下月份與日期範圍重疊、媒體有選到的分割
+        start = None if start_date is None else pd.Timestamp(start_date)
+        end = None if end_date is None else pd.Timestamp(end_date)
+        presses = None if presses is None else set(presses)
+        for partition in self.partitions:
+            if presses is not None and partition['press'] not in presses:
+                continue
+            if start is not None and pd.Timestamp(partition['max_date']) < start:
+                continue
+            if end is not None and pd.Timestamp(partition['min_date']) > end:
+                continue
+            covered = (start is None or pd.Timestamp(partition['min_date']) >= start) and \
+                      (end is None or pd.Timestamp(partition['max_date']) <= end)
+            yield partition, covered
+
+    def read(self, partition, start_date=None, end_date=None, columns=PARTITION_COLUMNS):
+        filters = []
+        if start_date is not None:
+            filters.append(('Date', '>=', pd.Timestamp(start_date)))
+        if end_date is not None:
+            filters.append(('Date', '<=', pd.Timestamp(end_date)))
+        return pd.read_parquet(os.path.join(self.root, partition['path']), columns=columns, filters=filters or None)
+
+    def summarize(self, by, start_date=None, end_date=None, presses=None, categories=None, monthly=False):
+        # 與 PanelCube.summarize 的輸出相同，記憶體只與分組數有關，與資料量無關
+        categories = None if categories is None else set(categories)
+        totals = {}
+
+        def add(press, month, category, values):
+            if categories is not None and category not in categories:
+                return
+            key = (press if 'Press' in by else None, category if 'Category' in by else None, month if monthly else None)
+            if key in totals:
+                totals[key] += values
+            else:
+                totals[key] = np.array(values, dtype=np.int64)
+
+        for partition, covered in self.select(start_date, end_date, presses):
+            if covered:
+                for category, values in partition['totals'].items():
+                    add(partition['press'], partition['month'], category, values)
+            else:
+                frame = self.read(partition, start_date, end_date, ['Category', *COUNT_COLUMNS])
+                partial = frame.groupby('Category', observed=True)[COUNT_COLUMNS].sum()
+                for category, values in zip(partial.index, partial.to_numpy(np.int64)):
+                    add(partition['press'], partition['month'], str(category), values)
+
+        levels = [name for name, used in [('Press', 'Press' in by), ('Category', 'Category' in by), ('MonthYear', monthly)] if used]
+        keys = sorted(key for key, values in totals.items() if values[0] > 0)
+        values = np.array([totals[key] for key in keys], dtype=np.int64).reshape(-1, len(COUNT_COLUMNS))
+        result = pd.DataFrame(values, columns=COUNT_COLUMNS)
+        for position, name in reversed(list(enumerate(['Press', 'Category', 'MonthYear']))):
+            if name in levels:
+                result.insert(0, name, [key[position] for key in keys])
+        # 與 PanelCube 相同的欄位順序 (Press, Category, MonthYear, 計數)
+        return result[[*levels, *COUNT_COLUMNS]]
+
+    def first_date(self, start_date=None, end_date=None):
+        # 範圍內最早有資料的日期；分割的最早日期已在範圍內時不需讀檔
+        first = None
+        for partition, _ in self.select(start_date, end_date):
+            if first is not None and pd.Timestamp(partition['min_date']) >= first:
+                continue
+            if start_date is None or pd.Timestamp(partition['min_date']) >= pd.Timestamp(start_date):
+                candidate = pd.Timestamp(partition['min_date'])
+            else:
+                dates = self.read(partition, start_date, end_date, ['Date'])['Date']
+                candidate = dates.min() if len(dates) else None
+            if candidate is not None and (first is None or candidate < first):
+                first = candidate
+        return first
+
+
+class PartitionedDataset:
+    # 與 PanelDataset 對應的唯讀資料：cube 是 PartitionedPanel，側邊欄的預設值由 manifest 取得，不需讀取分割
+    def __init__(self, root):
+        self.path = root
+        self.cube = PartitionedPanel(root)
+        self.version = self.cube.version
+        self.start_date = self.cube.min_date()
+        self.end_date = self.cube.max_date()
+        self.presses = list(dict.fromkeys(p['press'] for p in self.cube.partitions))
+        self.categories = list(dict.fromkeys(c for p in self.cube.partitions for c in p['totals']))
+
+    def partition_rows(self, start_date, end_date):
+        # 日期範圍內的 (分割, 範圍內的列數)，依 (月份, 媒體) 排序；整月都在範圍內的分割直接用 manifest 的列數
+        for partition, covered in self.cube.select(start_date, end_date):
+            rows = partition['rows'] if covered else len(self.cube.read(partition, start_date, end_date, ['Date']))
+            yield partition, rows
+
+    def count_rows(self, start_date, end_date):
+        return sum(rows for _, rows in self.partition_rows(start_date, end_date))
+
+    def select_date(self, start_date, end_date, offset=0, limit=None):
+        # 區間內第 offset 列起的 limit 列，列的順序為 (月份, 媒體, Date, Category)；只讀取這一頁用到的分割
+        frames, position = [], 0
+        for partition, rows in self.partition_rows(start_date, end_date):
+            if limit is not None and position >= offset + limit:
+                break
+            if position + rows > offset:
+                frame = self.cube.read(partition, start_date, end_date)
+                frame.insert(1, 'Press', partition['press'])
+                stop = rows if limit is None else min(rows, offset + limit - position)
+                frames.append(frame.iloc[max(offset - position, 0):stop])
+            position += rows
+        if not frames:
+            return pd.DataFrame(columns=['Date', 'Press', *PARTITION_COLUMNS[1:]])
+        return pd.concat(frames, ignore_index=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把 panel CSV (Date, Press, Category, 計數) 依月份與媒體分割成 parquet')
+    parser.add_argument('input', help='panel CSV，例如 panel_data_weekly.csv 或每日的 panel')
+    parser.add_argument('out_dir', help='分割輸出的資料夾')
+    parser.add_argument('--chunksize', type=int, default=1_000_000, help='每批讀取的筆數')
+    args = parser.parse_args(argv)
+
+    # 分批讀取並併入分割，記憶體只與批次大小有關
+    for chunk in pd.read_csv(args.input, index_col=0, chunksize=args.chunksize):
+        merge_partitions(chunk[['Date', 'Press', 'Category', *COUNT_COLUMNS]], args.out_dir)
+    manifest = load_store_manifest(args.out_dir)
+    print(f"{len(manifest['partitions'])} partitions in {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
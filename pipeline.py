@@ -0,0 +1,533 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from dedup import DEDUP_MODES, DEFAULT_SIMILARITY, TITLE_ROWS_DIR, DedupIndex, load_dedup_index, prepare_titles
+import is_clickbait
+from is_clickbait import (CRITERIA_COLUMNS, criterion_bit, load_rules, rule_changes, score_titles, scores_from_masks,
+                          title_masks, use_rules)
+from panel_store import clear_store, merge_partitions
+
+# 原始資料欄位與 app.py 讀取的 panel data 欄位
+RAW_COLUMNS = ['Date', 'Press', 'Category', 'Title']
+GROUP_COLUMNS = ['Press', 'Category']
+METHOD_COLUMNS = CRITERIA_COLUMNS[:14]
+COUNT_COLUMNS = ['Count_News', 'IsClickbait', *METHOD_COLUMNS]
+
+WEEKLY_FILE = 'panel_data_weekly.csv'
+THREE_MONTH_FILE = 'panel_data_three_month.csv'
+PROCESSED_FILE = 'processed_data.csv'
+MANIFEST_FILE = 'panel_manifest.json'
+
+# 跨媒體分析統一取 2023.08~2023.10 的資料
+THREE_MONTH_START = '2023-08-01'
+THREE_MONTH_END = '2023-10-31'
+
+
+def read_raw_chunks(path, chunksize):
+    # 依副檔名分批讀取 CSV 或 JSON lines，每批最多 chunksize 筆
+    if path.endswith(('.jsonl', '.json')):
+        reader = pd.read_json(path, lines=True, chunksize=chunksize, dtype={'Title': str})
+    else:
+        reader = pd.read_csv(path, usecols=RAW_COLUMNS, chunksize=chunksize, dtype={'Title': str})
+    for chunk in reader:
+        yield chunk[RAW_COLUMNS]
+
+
+def week_start(dates):
+    # panel data 的 Date 是每週的星期一
+    dates = pd.to_datetime(dates).dt.normalize()
+    return dates - pd.to_timedelta(dates.dt.weekday, unit='D')
+
+
+def count_rows(chunk, scores):
+    # 逐筆的計數欄位 (Date 為該週星期一)
+    rows = scores[['IsClickbait', *METHOD_COLUMNS]].astype('int64')
+    rows.insert(0, 'Count_News', 1)
+    rows.insert(0, 'Category', chunk['Category'].to_numpy())
+    rows.insert(0, 'Press', chunk['Press'].to_numpy())
+    rows.insert(0, 'Date', week_start(chunk['Date']).to_numpy())
+    rows['RawDate'] = pd.to_datetime(chunk['Date']).to_numpy()
+    return rows
+
+
+def score_chunk(chunk):
+    # 判斷一批標題，回傳逐筆的計數欄位
+    return count_rows(chunk, score_titles(chunk['Title']))
+
+
+def aggregate_rows(rows, window_start, window_end, daily=False):
+    weekly = rows.groupby(['Date', *GROUP_COLUMNS], sort=False)[COUNT_COLUMNS].sum()
+    in_window = rows['RawDate'].between(window_start, window_end)
+    three_month = rows[in_window].groupby(GROUP_COLUMNS, sort=False)[COUNT_COLUMNS].sum()
+    # 每日的加總只在要寫入分割的 panel (--panel-dir) 時計算
+    days = None
+    if daily:
+        days = rows.groupby([rows['RawDate'].dt.normalize().rename('Date'), *GROUP_COLUMNS], sort=False)[COUNT_COLUMNS].sum()
+    return weekly, three_month, days
+
+
+def aggregate_chunk(chunk, window_start, window_end, daily=False):
+    # 在 worker 內先做部分加總，只把小的彙總表傳回主程序
+    return aggregate_rows(score_chunk(chunk), window_start, window_end, daily)
+
+
+def chunk_titles(chunk):
+    return chunk['Title'].fillna('').astype(str).tolist()
+
+
+def dedup_chunk(chunk, index, prepared=None):
+    # 在主程序中把標題對應到標題編號，只留下要計數的列，並取出還沒判斷過的標題
+    title_ids = index.canonicalize(chunk_titles(chunk), prepared)
+    keep = index.claim(title_ids, chunk['Press'].tolist())
+    start, titles = index.take_unscored()
+    return chunk[keep], title_ids[keep], start, titles
+
+
+def aggregate_deduplicated(index, chunk, title_ids, window_start, window_end, daily=False):
+    # 用每個標題已判斷過的 bitmask 計數，不再重新判斷；計數的每一列也記錄下來，規則修改時可以只更新受影響的列
+    scores = scores_from_masks(index.masks[title_ids], chunk.index)
+    rows = count_rows(chunk, scores)
+    index.record_rows(title_ids, rows['Date'].to_numpy(), rows['RawDate'].dt.normalize().to_numpy(),
+                      rows['Press'].to_numpy(), rows['Category'].to_numpy(),
+                      rows['RawDate'].between(window_start, window_end).to_numpy())
+    return aggregate_rows(rows, window_start, window_end, daily)
+
+
+def combine(total, part):
+    if total is None:
+        return part
+    return total.add(part, fill_value=0)
+
+
+def score_corpus(path, chunksize=100_000, workers=None, window_start=THREE_MONTH_START, window_end=THREE_MONTH_END,
+                 index=None, daily=False):
+    # 串流讀取原始標題，分批丟給 process pool 判斷，並把結果加總成週 panel 與三個月 panel (daily 時另外加總每日 panel)
+    # 有 index 時先去重，判斷的次數只與不同的原始標題數有關
+    window_start = pd.Timestamp(window_start)
+    window_end = pd.Timestamp(window_end) + pd.Timedelta(days=1) - pd.Timedelta(1)
+    weekly = three_month = days = None
+
+    def reduce(result):
+        nonlocal weekly, three_month, days
+        weekly = combine(weekly, result[0])
+        three_month = combine(three_month, result[1])
+        if daily:
+            days = combine(days, result[2])
+
+    chunks = read_raw_chunks(path, chunksize)
+    workers = workers or os.cpu_count() or 1
+    if index is not None:
+        score_deduplicated(chunks, index, workers, window_start, window_end, reduce, daily)
+    elif workers == 1:
+        for chunk in chunks:
+            reduce(aggregate_chunk(chunk, window_start, window_end, daily))
+    else:
+        # 同時最多只有 2 * workers 批資料在記憶體中，記憶體用量不隨輸入大小成長
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for chunk in chunks:
+                pending.append(pool.submit(aggregate_chunk, chunk, window_start, window_end, daily))
+                if len(pending) >= 2 * workers:
+                    reduce(pending.pop(0).result())
+            for future in pending:
+                reduce(future.result())
+
+    return finalize_weekly(weekly), finalize_three_month(three_month), finalize_weekly(days) if daily else None
+
+
+def score_deduplicated(chunks, index, workers, window_start, window_end, reduce, daily=False):
+    # 正規化與 MinHash 交給 process pool，去重則依讀取順序在主程序進行；新的標題再交給 process pool 判斷。
+    # 依提交順序合併，合併某批時它用到的標題一定已經判斷完
+    def finish(masks, start, chunk, title_ids):
+        index.set_masks(start, masks)
+        reduce(aggregate_deduplicated(index, chunk, title_ids, window_start, window_end, daily))
+
+    if workers == 1:
+        for chunk in chunks:
+            chunk, title_ids, start, titles = dedup_chunk(chunk.reset_index(drop=True), index)
+            finish(title_masks(titles), start, chunk, title_ids)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        prepared, pending = [], []
+
+        def advance():
+            chunk, future = prepared.pop(0)
+            chunk, title_ids, start, titles = dedup_chunk(chunk, index, future.result())
+            pending.append((pool.submit(title_masks, titles), start, chunk, title_ids))
+            if len(pending) >= 2 * workers:
+                masks, *rest = pending.pop(0)
+                finish(masks.result(), *rest)
+
+        for chunk in chunks:
+            chunk = chunk.reset_index(drop=True)
+            prepared.append((chunk, pool.submit(prepare_titles, chunk_titles(chunk), index.similarity)))
+            if len(prepared) >= 2 * workers:
+                advance()
+        while prepared:
+            advance()
+        for masks, *rest in pending:
+            finish(masks.result(), *rest)
+
+
+def empty_counts(index_columns):
+    return pd.DataFrame(columns=[*index_columns, *COUNT_COLUMNS]).set_index(index_columns)
+
+
+def finalize_weekly(weekly):
+    if weekly is None:
+        weekly = empty_counts(['Date', *GROUP_COLUMNS])
+    weekly = weekly.astype('int64').sort_index().reset_index()
+    return weekly[['Date', *GROUP_COLUMNS, *COUNT_COLUMNS]]
+
+
+def finalize_three_month(three_month):
+    if three_month is None:
+        three_month = empty_counts(GROUP_COLUMNS)
+    three_month = three_month.astype('int64').sort_index().reset_index()
+    return three_month[[*GROUP_COLUMNS, *COUNT_COLUMNS]]
+
+
+def processed_from_weekly(weekly):
+    # processed_data.csv：各釣魚方法與 IsClickbait 佔該週新聞數的比例
+    processed = weekly[['Date', *GROUP_COLUMNS]].copy()
+    for column in [*METHOD_COLUMNS, 'IsClickbait']:
+        processed[column] = weekly[column] / weekly['Count_News']
+    return processed
+
+
+def write_csv(df, path):
+    # 先寫到暫存檔再取代，避免 app 讀到寫到一半的檔案
+    tmp_path = path + '.tmp'
+    df.to_csv(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_panels(weekly, three_month, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    write_csv(weekly, os.path.join(out_dir, WEEKLY_FILE))
+    write_csv(three_month, os.path.join(out_dir, THREE_MONTH_FILE))
+    write_csv(processed_from_weekly(weekly), os.path.join(out_dir, PROCESSED_FILE))
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'inputs': {}, 'three_month_start': THREE_MONTH_START, 'three_month_end': THREE_MONTH_END, 'partitions': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def check_finished(manifest):
+    if manifest.get('in_progress'):
+        raise SystemExit(f"上次的 {manifest['in_progress']} 沒有完成，panel 可能只更新了一部分，請以 build 重新產生")
+
+
+def begin_changes(manifest, out_dir, operation):
+    # 改寫資料前先在 manifest 記下進行中的操作，完成後才與新的 inputs/rules 一起清除 (finish_changes)
+    # 中途中斷時 panel 可能只合併了一部分，下次執行會拒絕繼續，而不是再合併一次造成重複計數
+    check_finished(manifest)
+    manifest['in_progress'] = operation
+    save_manifest(manifest, out_dir)
+
+
+def finish_changes(manifest, out_dir):
+    manifest.pop('in_progress', None)
+    save_manifest(manifest, out_dir)
+
+
+def scan_partitions(path):
+    # 週 panel 依 Date 排序，記錄每一週第一筆資料的 byte offset 與列號，之後只需改寫受影響的週
+    partitions = {'weeks': [], 'offsets': [], 'rows': [], 'total_rows': 0, 'size': os.path.getsize(path)}
+    with open(path, 'rb') as f:
+        offset = len(f.readline())
+        for line in f:
+            week = line.split(b',', 2)[1].decode()
+            if not partitions['weeks'] or partitions['weeks'][-1] != week:
+                partitions['weeks'].append(week)
+                partitions['offsets'].append(offset)
+                partitions['rows'].append(partitions['total_rows'])
+            partitions['total_rows'] += 1
+            offset += len(line)
+    return partitions
+
+
+def store_dir(manifest, out_dir):
+    # 分割的每日 panel 所在資料夾 (以 --panel-dir 建立時才有)
+    panel_dir = manifest.get('panel_dir')
+    return None if panel_dir is None else os.path.join(out_dir, panel_dir)
+
+
+def get_partitions(manifest, path):
+    partitions = manifest['partitions'].get(os.path.basename(path))
+    # 檔案被其他方式改寫過就重新掃描
+    if partitions is None or partitions['size'] != os.path.getsize(path):
+        partitions = scan_partitions(path)
+    return partitions
+
+
+def rewrite_tail(path, partitions, first_week, tail_builder):
+    # 從 first_week 開始的資料交給 tail_builder 合併，只重新產生檔案尾端；
+    # 與 write_csv 一樣先寫到暫存檔 (複製不變的前段再接上新的尾端) 再取代，app 不會讀到寫到一半的檔案
+    position = bisect.bisect_left(partitions['weeks'], first_week)
+    if position < len(partitions['weeks']):
+        offset, row = partitions['offsets'][position], partitions['rows'][position]
+    else:
+        offset, row = partitions['size'], partitions['total_rows']
+
+    tmp_path = path + '.tmp'
+    with open(path, 'rb') as f, open(tmp_path, 'wb') as out:
+        columns = f.readline().decode().rstrip('\r\n').split(',')[1:]
+        f.seek(offset)
+        old_tail = pd.read_csv(f, header=None, names=['', *columns], index_col=0) if offset < partitions['size'] else pd.DataFrame(columns=columns)
+        tail = tail_builder(old_tail)
+        tail.index = range(row, row + len(tail))
+        data = tail.to_csv(header=False, date_format='%Y-%m-%d').encode('utf-8')
+        f.seek(0)
+        remaining = offset
+        while remaining:
+            block = f.read(min(remaining, 1 << 20))
+            out.write(block)
+            remaining -= len(block)
+        out.write(data)
+    os.replace(tmp_path, path)
+
+    # 更新受影響週的 offset
+    del partitions['weeks'][position:], partitions['offsets'][position:], partitions['rows'][position:]
+    for line in data.splitlines(keepends=True):
+        week = line.split(b',', 2)[1].decode()
+        if not partitions['weeks'] or partitions['weeks'][-1] != week:
+            partitions['weeks'].append(week)
+            partitions['offsets'].append(offset)
+            partitions['rows'].append(row)
+        offset += len(line)
+        row += 1
+    partitions['total_rows'] = row
+    partitions['size'] = offset
+    return tail
+
+
+def merge_counts(old, new, index_columns):
+    old = old.copy()
+    if 'Date' in index_columns:
+        old['Date'] = pd.to_datetime(old['Date'])
+    merged = old.set_index(index_columns)[COUNT_COLUMNS].add(new.set_index(index_columns)[COUNT_COLUMNS], fill_value=0)
+    return merged.astype('int64').sort_index().reset_index()
+
+
+def build(args):
+    # build 會重新產生所有資料，上次中斷的操作也一併覆蓋
+    os.makedirs(args.out_dir, exist_ok=True)
+    previous = load_manifest(args.out_dir)
+    previous.pop('in_progress', None)
+    begin_changes(previous, args.out_dir, f'build {args.input}')
+    index = None if args.dedup == 'none' else DedupIndex(args.dedup, args.similarity)
+    if index is not None:
+        index.stage_rows(args.out_dir)
+    weekly, three_month, daily = score_corpus(args.input, args.chunksize, args.workers, args.three_month_start,
+                                              args.three_month_end, index, daily=args.panel_dir is not None)
+    write_panels(weekly, three_month, args.out_dir)
+    # 重新建立時不保留舊的逐列紀錄與分割
+    shutil.rmtree(os.path.join(args.out_dir, TITLE_ROWS_DIR), ignore_errors=True)
+    if args.panel_dir is not None:
+        clear_store(args.panel_dir)
+        merge_partitions(daily, args.panel_dir)
+    if index is not None:
+        index.save(args.out_dir)
+    manifest = {
+        'inputs': {file_digest(args.input): {'path': args.input, 'rows': int(weekly['Count_News'].sum())}},
+        'three_month_start': args.three_month_start,
+        'three_month_end': args.three_month_end,
+        'dedup': args.dedup,
+        'similarity': args.similarity,
+        'rules': is_clickbait.RULES,
+        # 相對於 out_dir，整個資料夾搬移後仍然有效
+        'panel_dir': None if args.panel_dir is None else os.path.relpath(args.panel_dir, args.out_dir),
+        'partitions': {name: scan_partitions(os.path.join(args.out_dir, name)) for name in [WEEKLY_FILE, PROCESSED_FILE]},
+    }
+    finish_changes(manifest, args.out_dir)
+    print(f'{int(weekly["Count_News"].sum())} titles -> {len(weekly)} weekly rows, {len(three_month)} three-month rows')
+    if index is not None:
+        print(f'dedup ({args.dedup}): {len(index)} distinct titles scored, {index.num_groups} near-duplicate groups')
+
+
+def update(args):
+    # 只判斷新進的標題，把加總併入既有的 panel，並只改寫受影響的週
+    manifest = load_manifest(args.out_dir)
+    weekly_path = os.path.join(args.out_dir, WEEKLY_FILE)
+    if not os.path.exists(weekly_path):
+        return build(args)
+
+    check_finished(manifest)
+    if manifest.get('rules', is_clickbait.RULES) != is_clickbait.RULES:
+        raise SystemExit(f'判斷規則在建立 panel 後改過，請先執行 rescore (規則檔 {is_clickbait.RULES_PATH})')
+
+    digest = file_digest(args.input)
+    if digest in manifest['inputs']:
+        print(f'{args.input} 已經合併過，略過')
+        return
+
+    # 沿用建立 panel 時的去重方式，已計數過的標題不會再計數
+    mode = manifest.get('dedup', 'none')
+    index = None if mode == 'none' else load_dedup_index(args.out_dir, mode, manifest.get('similarity', DEFAULT_SIMILARITY))
+    if index is not None:
+        index.stage_rows(args.out_dir)
+    panel_dir = store_dir(manifest, args.out_dir)
+    new_weekly, new_three_month, new_daily = score_corpus(args.input, args.chunksize, args.workers,
+                                                          manifest['three_month_start'], manifest['three_month_end'], index,
+                                                          daily=panel_dir is not None)
+    begin_changes(manifest, args.out_dir, f'update {args.input}')
+    # 分割的 panel 只改寫新資料落在的 (月份, 媒體)
+    if panel_dir is not None:
+        merge_partitions(new_daily, panel_dir)
+    if not new_weekly.empty:
+        first_week = new_weekly['Date'].min().strftime('%Y-%m-%d')
+        weekly_partitions = get_partitions(manifest, weekly_path)
+        processed_partitions = get_partitions(manifest, os.path.join(args.out_dir, PROCESSED_FILE))
+        weekly_tail = rewrite_tail(weekly_path, weekly_partitions, first_week,
+                                   lambda old: merge_counts(old, new_weekly, ['Date', *GROUP_COLUMNS]))
+        rewrite_tail(os.path.join(args.out_dir, PROCESSED_FILE), processed_partitions, first_week,
+                     lambda old: processed_from_weekly(weekly_tail))
+        manifest['partitions'] = {WEEKLY_FILE: weekly_partitions, PROCESSED_FILE: processed_partitions}
+
+    # 三個月 panel 只有在新資料落在分析期間內時才需要改寫
+    if new_three_month['Count_News'].sum() > 0:
+        three_month_path = os.path.join(args.out_dir, THREE_MONTH_FILE)
+        old_three_month = pd.read_csv(three_month_path, index_col=0)
+        write_csv(merge_counts(old_three_month, new_three_month, GROUP_COLUMNS), three_month_path)
+
+    if index is not None:
+        index.save(args.out_dir)
+    manifest['inputs'][digest] = {'path': args.input, 'rows': int(new_weekly['Count_News'].sum())}
+    finish_changes(manifest, args.out_dir)
+    print(f'{int(new_weekly["Count_News"].sum())} new titles merged into {new_weekly["Date"].nunique()} weeks')
+
+
+def row_counts(masks, strong_mask):
+    scores = scores_from_masks(masks, strong_mask=strong_mask)
+    return scores[['IsClickbait', *METHOD_COLUMNS]].to_numpy(np.int64)
+
+
+def rescore(args):
+    # 規則修改後，只重新判斷含有變動字詞的標題、只更新受影響的判斷方法，再把差額併入 panel
+    started = time.perf_counter()
+    manifest = load_manifest(args.out_dir)
+    if manifest.get('dedup', 'none') == 'none' or 'rules' not in manifest:
+        raise SystemExit('rescore 需要以 --dedup global 或 press 建立的 panel (保存了每個標題的判斷結果)')
+    check_finished(manifest)
+    index = load_dedup_index(args.out_dir, manifest['dedup'])
+    old_rules, new_rules = manifest['rules'], load_rules(args.rules)
+    changed, words, strong_changed = rule_changes(old_rules, new_rules)
+    old_strong = sum(criterion_bit(n) for n in old_rules['strong_criteria'])
+    use_rules(new_rules)
+
+    # 用字元倒排索引找出含有變動字詞的標題，只有這些標題的結果可能改變
+    ids = index.titles_containing(words)
+    fresh = title_masks([index.titles[i] for i in ids])
+    before = index.masks.copy()
+    index.masks[ids] = (before[ids] & ~np.uint16(changed)) | (fresh & np.uint16(changed))
+    moved = ids[before[ids] != index.masks[ids]]
+
+    rows = index.load_rows(args.out_dir)
+    if not strong_changed:
+        rows = rows[np.isin(rows['TitleId'].to_numpy(), moved)]
+    title_ids = rows['TitleId'].to_numpy()
+    delta = pd.DataFrame(row_counts(index.masks[title_ids], is_clickbait.STRONG_MASK) - row_counts(before[title_ids], old_strong),
+                         columns=['IsClickbait', *METHOD_COLUMNS], index=rows.index)
+    delta.insert(0, 'Count_News', 0)
+    delta = pd.concat([rows[['Date', 'Day', 'InWindow']], rows[GROUP_COLUMNS].astype(str), delta], axis=1)
+    delta = delta[delta[COUNT_COLUMNS].any(axis=1)]
+
+    weekly_path = os.path.join(args.out_dir, WEEKLY_FILE)
+    three_month_path = os.path.join(args.out_dir, THREE_MONTH_FILE)
+    weekly, three_month = pd.read_csv(weekly_path, index_col=0), pd.read_csv(three_month_path, index_col=0)
+    begin_changes(manifest, args.out_dir, f'rescore {args.rules}')
+    if not delta.empty:
+        weekly_delta = delta.groupby(['Date', *GROUP_COLUMNS], observed=True)[COUNT_COLUMNS].sum().reset_index()
+        weekly = merge_counts(weekly, weekly_delta, ['Date', *GROUP_COLUMNS])
+        in_window = delta[delta['InWindow']]
+        if not in_window.empty:
+            three_month_delta = in_window.groupby(GROUP_COLUMNS, observed=True)[COUNT_COLUMNS].sum().reset_index()
+            three_month = merge_counts(three_month, three_month_delta, GROUP_COLUMNS)
+        write_panels(weekly[['Date', *GROUP_COLUMNS, *COUNT_COLUMNS]], three_month[[*GROUP_COLUMNS, *COUNT_COLUMNS]],
+                     args.out_dir)
+        if store_dir(manifest, args.out_dir) is not None:
+            daily_delta = delta.groupby(['Day', *GROUP_COLUMNS], observed=True)[COUNT_COLUMNS].sum().reset_index()
+            merge_partitions(daily_delta.rename(columns={'Day': 'Date'}), store_dir(manifest, args.out_dir))
+        manifest['partitions'] = {name: scan_partitions(os.path.join(args.out_dir, name)) for name in [WEEKLY_FILE, PROCESSED_FILE]}
+
+    index.save(args.out_dir)
+    manifest['rules'] = new_rules
+    finish_changes(manifest, args.out_dir)
+    columns = [CRITERIA_COLUMNS[n - 1] for n in range(1, len(CRITERIA_COLUMNS) + 1) if changed & criterion_bit(n)]
+    print(f'rules v{old_rules.get("version")} -> v{new_rules.get("version")}: changed {columns or "-"}'
+          f'{", strong criteria" if strong_changed else ""}; {len(ids)} of {len(index)} titles rescored, '
+          f'{len(moved)} changed, {len(delta)} rows updated in {time.perf_counter() - started:.2f}s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把原始新聞標題 (Date, Press, Category, Title) 轉成 app.py 使用的 panel data')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='從原始標題檔重新產生所有 panel CSV')
+    build_parser.add_argument('input', help='原始標題檔 (.csv 或 .jsonl)')
+    build_parser.add_argument('--out-dir', default='.', help='輸出資料夾')
+    build_parser.add_argument('--chunksize', type=int, default=100_000, help='每批讀取的筆數')
+    build_parser.add_argument('--workers', type=int, default=None, help='process 數量 (預設為 CPU 核心數)')
+    build_parser.add_argument('--three-month-start', default=THREE_MONTH_START)
+    build_parser.add_argument('--three-month-end', default=THREE_MONTH_END)
+    build_parser.add_argument('--dedup', choices=DEDUP_MODES, default='press',
+                              help='重複標題的計數方式：none 每筆都算、global 整個語料只算一次、press 每家媒體各算一次')
+    build_parser.add_argument('--similarity', type=float, default=DEFAULT_SIMILARITY,
+                              help='近似重複的 Jaccard 門檻 (只影響計數)；預設 1 只合併正規化後完全相同的標題，例如 0.8 會把改寫過的轉載也只算一次')
+    build_parser.add_argument('--panel-dir', default=None,
+                              help='另外輸出依 (月份, 媒體) 分割的每日 panel，app.py 以 CLICKBAIT_PANEL_DIR 指定時使用')
+    build_parser.set_defaults(func=build)
+
+    update_parser = subparsers.add_parser('update', help='只判斷新進的標題並合併進既有的 panel CSV')
+    update_parser.add_argument('input', help='新進的原始標題檔 (.csv 或 .jsonl)')
+    update_parser.add_argument('--out-dir', default='.', help='panel CSV 與 manifest 所在資料夾')
+    update_parser.add_argument('--chunksize', type=int, default=100_000, help='每批讀取的筆數')
+    update_parser.add_argument('--workers', type=int, default=None, help='process 數量 (預設為 CPU 核心數)')
+    update_parser.add_argument('--three-month-start', default=THREE_MONTH_START, help='沒有既有 panel 時使用')
+    update_parser.add_argument('--three-month-end', default=THREE_MONTH_END, help='沒有既有 panel 時使用')
+    update_parser.add_argument('--dedup', choices=DEDUP_MODES, default='press', help='沒有既有 panel 時使用')
+    update_parser.add_argument('--similarity', type=float, default=DEFAULT_SIMILARITY, help='沒有既有 panel 時使用')
+    update_parser.add_argument('--panel-dir', default=None, help='沒有既有 panel 時使用')
+    update_parser.set_defaults(func=update)
+
+    rescore_parser = subparsers.add_parser('rescore', help='判斷規則修改後，只重新判斷受影響的標題並更新 panel CSV')
+    rescore_parser.add_argument('--rules', default=is_clickbait.RULES_PATH, help='新的規則檔')
+    rescore_parser.add_argument('--out-dir', default='.', help='panel CSV、manifest 與去重索引所在資料夾')
+    rescore_parser.set_defaults(func=rescore)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
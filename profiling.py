@@ -0,0 +1,88 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# 設定環境變數 CLICKBAIT_PROFILE=1 才會記錄；沒開啟時 stage() 與 timed() 幾乎沒有額外成本
+ENABLED = os.environ.get('CLICKBAIT_PROFILE', '') not in ('', '0')
+# 每次 run() 結束時把該次各階段的耗時以 JSON lines 附加到這個檔案
+LOG_PATH = os.environ.get('CLICKBAIT_PROFILE_LOG')
+
+_lock = threading.Lock()
+# stage 名稱 -> [次數, 總秒數, 最大秒數]
+_totals = {}
+# 每個 Streamlit session 在自己的 thread 執行，各自記錄這次 run 的事件
+_local = threading.local()
+_NULL_CONTEXT = nullcontext()
+
+
+def record(name, seconds):
+    with _lock:
+        entry = _totals.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+    events = getattr(_local, 'events', None)
+    if events is not None:
+        events.append((name, seconds))
+
+
+@contextmanager
+def _timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def stage(name):
+    return _timer(name) if ENABLED else _NULL_CONTEXT
+
+
+def timed(function=None, name=None):
+    # 沒開啟時直接回傳原本的函式
+    if function is None:
+        return functools.partial(timed, name=name)
+    if not ENABLED:
+        return function
+    stage_name = name or function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with _timer(stage_name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def begin_run():
+    if ENABLED:
+        _local.events = []
+
+
+def end_run(**context):
+    # 回傳這次 run 的各階段耗時，並寫入 LOG_PATH
+    events = getattr(_local, 'events', None)
+    _local.events = None
+    if not events:
+        return []
+    stages = [{'stage': name, 'ms': seconds * 1000} for name, seconds in events]
+    if LOG_PATH:
+        line = json.dumps({'time': time.time(), **context, 'stages': stages}, ensure_ascii=False, default=str)
+        with _lock, open(LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+    return stages
+
+
+def stage_stats():
+    with _lock:
+        items = list(_totals.items())
+    return [{'stage': name, 'count': count, 'total_ms': total * 1000, 'mean_ms': total * 1000 / count, 'max_ms': longest * 1000}
+            for name, (count, total, longest) in sorted(items, key=lambda item: -item[1][1])]
+
+
+def reset():
+    with _lock:
+        _totals.clear()
@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from is_clickbait import CRITERIA_COLUMNS, score_titles
+
+# 一批最多判斷的標題數與等待湊批的最長時間
+MAX_BATCH = 512
+MAX_DELAY_MS = 5
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class MicroBatcher:
+    # 把同時進來的請求合併成一次 score_titles 呼叫，再把結果分回各請求
+    def __init__(self, max_batch=MAX_BATCH, max_delay_ms=MAX_DELAY_MS):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.titles = 0
+
+    async def score(self, titles):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((titles, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_delay
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            titles = [title for item, _ in pending for title in item]
+            try:
+                # 判斷在 thread 中執行，不擋住 event loop 接收新的請求
+                results = await loop.run_in_executor(None, score_batch, titles)
+            except Exception as error:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.batches += 1
+            self.titles += len(titles)
+            start = 0
+            for item, future in pending:
+                if not future.done():
+                    future.set_result(results[start:start + len(item)])
+                start += len(item)
+
+
+def score_batch(titles):
+    scores = score_titles(titles)
+    flags = scores[CRITERIA_COLUMNS].to_numpy()
+    verdicts = scores['IsClickbait'].to_numpy()
+    return [{'title': title, 'is_clickbait': bool(verdict), 'criteria': dict(zip(CRITERIA_COLUMNS, row.tolist()))}
+            for title, verdict, row in zip(titles, verdicts, flags)]
+
+
+def response(status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+              431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}[status]
+    head = f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\nContent-Length: {len(body)}\r\n\r\n'
+    return head.encode('ascii') + body
+
+
+def is_valid_text(title):
+    # JSON 的 \ud800 這類單獨的 surrogate 無法編碼成 UTF-8，回應時也無法輸出
+    try:
+        title.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+async def handle_request(batcher, method, path, body):
+    if method == 'GET' and path == '/health':
+        return response(200, {'status': 'ok', 'batches': batcher.batches, 'titles': batcher.titles})
+    if method != 'POST' or path != '/score':
+        return response(404, {'error': 'use POST /score or GET /health'})
+    # 接受單一標題 (JSON 字串) 或標題陣列 (JSON array)
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return response(400, {'error': 'body must be JSON'})
+    titles = [payload] if isinstance(payload, str) else payload
+    if not isinstance(titles, list) or not all(isinstance(title, str) for title in titles):
+        return response(400, {'error': 'body must be a JSON string or an array of strings'})
+    if not all(map(is_valid_text, titles)):
+        return response(400, {'error': 'titles must be valid Unicode (no lone surrogates)'})
+    try:
+        results = await batcher.score(titles) if titles else []
+    except Exception:
+        return response(500, {'error': 'scoring failed'})
+    return response(200, results[0] if isinstance(payload, str) else results)
+
+
+async def read_head(reader):
+    # 讀取請求行與 header；單行超過 StreamReader 的上限 (64KB) 時 readline 會丟出 ValueError
+    request_line = await reader.readline()
+    headers = {}
+    if not request_line.strip():
+        return request_line, headers
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return request_line, headers
+
+
+async def handle_connection(batcher, reader, writer):
+    # 最小的 HTTP/1.1 實作，支援 keep-alive
+    try:
+        while True:
+            try:
+                request_line, headers = await read_head(reader)
+            except ValueError:
+                writer.write(response(431, {'error': 'request line or header too long'}))
+                await writer.drain()
+                break
+            if not request_line.strip():
+                break
+            try:
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                length = int(headers.get('content-length', 0))
+                if length < 0:
+                    raise ValueError(f'negative Content-Length {length}')
+            except ValueError:
+                # 無法解析的請求：回覆 400 後關閉連線
+                writer.write(response(400, {'error': 'malformed HTTP request'}))
+                await writer.drain()
+                break
+            if length > MAX_BODY_BYTES:
+                writer.write(response(413, {'error': 'body too large'}))
+                await writer.drain()
+                break
+            body = await reader.readexactly(length) if length else b''
+            try:
+                reply = await handle_request(batcher, method, path.split('?', 1)[0], body)
+            except Exception:
+                reply = response(500, {'error': 'internal error'})
+            writer.write(reply)
+            await writer.drain()
+            if headers.get('connection', '').lower() == 'close':
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, max_batch, max_delay_ms):
+    batcher = MicroBatcher(max_batch, max_delay_ms)
+    batch_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(batcher, reader, writer), host, port)
+    print(f'scoring service listening on http://{host}:{port} (POST /score)', flush=True)
+    async with server:
+        try:
+            await server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+async def load_worker(host, port, bodies, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            request = (f'POST /score HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                       f'Content-Length: {len(body)}\r\n\r\n').encode('ascii') + body
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load_test(url, concurrency_levels, requests, titles_per_request):
+    # 在不同的同時連線數下送出請求，回報吞吐量與延遲分布
+    from benchmark import synthetic_titles
+    parts = urlsplit(url)
+    titles = next(synthetic_titles(max(requests * titles_per_request, 1)))
+    bodies = []
+    for i in range(requests):
+        chunk = titles[i * titles_per_request:(i + 1) * titles_per_request]
+        payload = chunk[0] if titles_per_request == 1 else chunk
+        bodies.append(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    for concurrency in concurrency_levels:
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(load_worker(parts.hostname, parts.port, bodies[i::concurrency], latencies)
+                               for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        ms = np.asarray(latencies) * 1000
+        print(f'concurrency {concurrency:>4}: {len(latencies) / elapsed:>9,.0f} req/s  '
+              f'{len(latencies) * titles_per_request / elapsed:>10,.0f} titles/s  '
+              f'p50 {np.percentile(ms, 50):7.2f} ms  p99 {np.percentile(ms, 99):7.2f} ms  p99.9 {np.percentile(ms, 99.9):7.2f} ms',
+              flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='釣餌式標題判斷 HTTP 服務 (不經過 Streamlit)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='啟動服務')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='每批最多判斷的標題數')
+    serve_parser.add_argument('--max-delay-ms', type=float, default=MAX_DELAY_MS, help='等待湊批的最長時間 (ms)')
+
+    load_parser = subparsers.add_parser('loadgen', help='對服務送出負載並回報吞吐量與延遲')
+    load_parser.add_argument('--url', default='http://127.0.0.1:8000')
+    load_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    load_parser.add_argument('--requests', type=int, default=2000, help='每個同時連線數下的請求總數')
+    load_parser.add_argument('--titles-per-request', type=int, default=1, help='1 表示送單一標題，大於 1 送 JSON array')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_delay_ms))
+    else:
+        asyncio.run(load_test(args.url, args.concurrency, args.requests, args.titles_per_request))
+
+
+if __name__ == '__main__':
+    main()
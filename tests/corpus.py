@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from benchmark import synthetic_titles
+
+PRESSES = ['ETToday', '報導者', '今日新聞', 'TVBS', 'Storm Media', 'NewsLens', 'NewYorkTimes', '三立']
+CATEGORIES = ['politics', 'finance', 'entertainment', 'health', 'life', 'tech', 'global']
+
+
+def raw_corpus(n, seed=0, unique=None):
+    # 假的原始標題檔 (Date, Press, Category, Title)；unique 小於 n 時標題會重複出現 (轉載)
+    rng = np.random.default_rng(seed)
+    titles = np.array(next(synthetic_titles(unique or n, seed=seed)), dtype=object)
+    start, end = pd.Timestamp('2023-06-01').value // 10**9, pd.Timestamp('2023-12-31').value // 10**9
+    return pd.DataFrame({
+        'Date': pd.to_datetime(rng.integers(start, end, n), unit='s').strftime('%Y-%m-%d %H:%M:%S'),
+        'Press': rng.choice(PRESSES, n),
+        'Category': rng.choice(CATEGORIES, n),
+        'Title': titles[rng.integers(0, len(titles), n)] if unique else titles,
+    })
+
+
+def write_corpus(df, path):
+    df.to_csv(path, index=False)
+    return str(path)
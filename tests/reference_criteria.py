@@ -0,0 +1,118 @@
+import re
+
+# 原本逐一掃描的 criterion_1 ~ criterion_15 (去掉 print)，作為單次掃描判斷引擎的對照
+# 唯一的差別：criterion_6 依規則檔的順序檢查量詞 (原本用 set，結果會隨 PYTHONHASHSEED 改變)
+QUANTIFIERS = ["個", "種", "項", "位", "張", "大", "招"]
+
+
+def criterion_1(title):
+    target_characters = ["他", "她", "它", "他們", "她們", "它們", "祂", "牠", "你", "妳", "這"]
+    return int(any(target_character in title for target_character in target_characters))
+
+
+def criterion_2(title):
+    target_characters = ["崩", "砲", "瘋", "扯", "狂", "激", "慘", "笑", "哭", "酸", "諷", "神", "猛", "讚", "嗆", "轟", "罵", "怒",
+                         "怒斥", "冷回", "飆罵", "怒批", "痛批", "打臉", "譴責"]
+    return int(any(target_character in title for target_character in target_characters))
+
+
+def criterion_3(title):
+    return int(len(re.findall(r'[!？！?]', title)) >= 2)
+
+
+def criterion_4(title):
+    target_characters = r'(?!驚天|驚訝|辯才|人才|步步驚心|專才|育才|武嚇|才是|恐嚇)(居然|竟然|竟|甚至|甚而|反而|反倒|原來|未料|不料|想不到|沒想到|才|卻|驚)'
+    return int(re.search(target_characters, title) is not None)
+
+
+def criterion_5(title):
+    target_characters = ["⋯⋯", "⋯", "...", "…"]
+    return int(any(target_character in title for target_character in target_characters))
+
+
+def chinese_to_arabic(chinese_number):
+    chinese_number_map = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9, '十': 10}
+    for char in chinese_number:
+        if char in chinese_number_map:
+            chinese_number = chinese_number.replace(char, str(chinese_number_map[char]))
+    return chinese_number
+
+
+def criterion_6(news_title):
+    news_title = chinese_to_arabic(news_title)
+    title_without_spaces = "".join(news_title.split())
+    for quantifier in QUANTIFIERS:
+        if quantifier in title_without_spaces:
+            try:
+                if quantifier == "個":
+                    month_char = title_without_spaces.split(f"{quantifier}")[1][0]
+                    if month_char == "月":
+                        return 0
+                    else:
+                        last_char = title_without_spaces.split(f"{quantifier}")[0][-1]
+                        if last_char.isdigit():
+                            return 1
+                else:
+                    last_char = title_without_spaces.split(f"{quantifier}")[0][-1]
+                    if last_char.isdigit():
+                        return 1
+            except IndexError:
+                pass
+    return 0
+
+
+def criterion_7(title):
+    return int(any(target_character in title for target_character in ["如何", "該怎麼做", "該如何"]))
+
+
+def criterion_8(title):
+    return int(any(target_character in title for target_character in ["嗯", "哎", "咦", "啊", "唉", "呦"]))
+
+
+def criterion_9(title):
+    return int(any(target_character in title for target_character in ["曝光", "自爆", "爆料", "再爆"]))
+
+
+def criterion_10(title):
+    target_characters = ["正妹", "美女", "老司機", "傻眼", "性感", "辣", "小模", "女神", "嫩", "甜美", "型男", "嘟嘴", "寶寶", "可愛"]
+    return int(any(target_character in title for target_character in target_characters))
+
+
+def criterion_11(title):
+    return int(re.search(r'了', title) is not None)
+
+
+def criterion_12(title):
+    return int(re.search(r'網(?!路|站|銀)', title) is not None)
+
+
+def criterion_13(title):
+    target_characters = ["最", "太", "狠", "極其", "更加", "非常", "格外", "越加", "神", "狂", "超"]
+    return int(any(target_character in title for target_character in target_characters))
+
+
+def criterion_14(title):
+    target_characters = r'(?!宣傳|傳統|傳奇|傳遞|頻傳|銘傳|傳訊|傳喚|傳承|遠傳|傳記|驚恐|恐嚇|恐怖|唯恐天下不亂|質疑|遲疑|疑點|疑惑)(傳|瘋傳|轉傳|網傳|誤傳|疑|恐)'
+    return int(re.search(target_characters, title) is not None)
+
+
+def criterion_15(title):
+    return int(len(re.findall(r'[!？！?]', title)) >= 1)
+
+
+CRITERIA = [criterion_1, criterion_2, criterion_3, criterion_4, criterion_5, criterion_6, criterion_7, criterion_8,
+            criterion_9, criterion_10, criterion_11, criterion_12, criterion_13, criterion_14, criterion_15]
+
+
+def criteria_results(title):
+    return [criterion(title) for criterion in CRITERIA]
+
+
+def is_clickbait(title):
+    results = criteria_results(title)
+    if results[0] or results[2] or results[4] or results[6] or results[7] or results[8] or results[11] == 1:
+        return 1
+    elif sum(results) >= 2:
+        return 1
+    else:
+        return 0
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipeline
+from dedup import DEFAULT_SIMILARITY, DedupIndex, shingle_text
+from is_clickbait import match_criteria, title_masks
+from title_index import TitleIndex
+
+BASE = '柯文哲回應市政府預算案爭議'
+VARIANTS = [BASE, BASE + '？！', BASE + '⋯⋯', BASE + '了', BASE + ' 網友']
+
+
+def scored_index(titles, presses, mode='press', similarity=DEFAULT_SIMILARITY):
+    index = DedupIndex(mode, similarity)
+    title_ids = index.canonicalize(titles)
+    keep = index.claim(title_ids, presses)
+    start, unscored = index.take_unscored()
+    index.set_masks(start, title_masks(unscored))
+    return index, title_ids, keep
+
+
+def test_shingles_keep_punctuation():
+    assert shingle_text(BASE + '？！') != shingle_text(BASE)
+    assert shingle_text(BASE + '⋯⋯') != shingle_text(BASE)
+
+
+@pytest.mark.parametrize('similarity', [DEFAULT_SIMILARITY, 0.8])
+def test_near_duplicates_keep_their_own_mask(similarity):
+    # 近似重複只影響計數，每個標題仍以自己的文字判斷
+    index, title_ids, _ = scored_index(VARIANTS, ['ETToday'] * len(VARIANTS), similarity=similarity)
+    assert len(set(title_ids.tolist())) == len(VARIANTS)
+    assert [index.titles[i] for i in title_ids] == VARIANTS
+    assert index.masks[title_ids].tolist() == [match_criteria(title) for title in VARIANTS]
+
+
+def test_default_counts_every_distinct_title():
+    _, _, keep = scored_index(VARIANTS, ['ETToday'] * len(VARIANTS))
+    assert keep.all()
+    # 正規化後完全相同 (全形、大小寫、空白) 的標題只算一次，但各自判斷
+    index, title_ids, keep = scored_index(['ABC 新聞', 'ａｂｃ  新聞'], ['ETToday', 'ETToday'])
+    assert title_ids.tolist() == [0, 1] and keep.tolist() == [True, False]
+    assert index.groups == [0, 0]
+
+
+def test_normalization_does_not_share_scores():
+    # NFKC 會把「．．．」變成「...」(criterion 5)，兩者的判斷結果不同，不能共用
+    titles = ['選舉結果出爐．．．', '選舉結果出爐...']
+    index, title_ids, keep = scored_index(titles, ['ETToday', 'TVBS'])
+    assert title_ids.tolist() == [0, 1] and keep.all()
+    assert index.masks[title_ids].tolist() == [match_criteria(title) for title in titles]
+    assert index.masks[1] != index.masks[0]
+
+
+def test_press_dedup_counts_match_no_dedup(tmp_path):
+    # 每家媒體各出現一次時，press 去重與不去重的 panel 相同
+    raw = pd.DataFrame({
+        'Date': ['2023-10-02 08:00:00', '2023-10-02 09:00:00'],
+        'Press': ['ETToday', 'TVBS'],
+        'Category': ['politics'] * 2,
+        'Title': ['選舉結果出爐．．．', '選舉結果出爐...'],
+    })
+    raw.to_csv(tmp_path / 'raw.csv', index=False)
+    for dedup in ['none', 'press']:
+        pipeline.main(['build', str(tmp_path / 'raw.csv'), '--out-dir', str(tmp_path / dedup), '--workers', '1',
+                       '--dedup', dedup])
+    panels = [pd.read_csv(tmp_path / dedup / pipeline.THREE_MONTH_FILE, index_col=0) for dedup in ['none', 'press']]
+    pd.testing.assert_frame_equal(*panels)
+
+
+def test_near_duplicate_counting_is_per_press():
+    presses = ['ETToday', 'ETToday', 'TVBS', 'TVBS']
+    _, _, keep = scored_index([BASE, BASE + '了', BASE + '了', BASE], presses, similarity=0.8)
+    assert keep.tolist() == [True, False, True, False]
+
+
+def test_title_query_shows_each_outlets_headline(tmp_path):
+    raw = pd.DataFrame({
+        'Date': ['2023-10-02 08:00:00', '2023-10-02 09:00:00', '2023-10-03 10:00:00'],
+        'Press': ['ETToday', 'TVBS', '三立'],
+        'Category': ['politics'] * 3,
+        'Title': [BASE, BASE + '？！', BASE + '⋯⋯'],
+    })
+    raw.to_csv(tmp_path / 'raw.csv', index=False)
+    pipeline.main(['build', str(tmp_path / 'raw.csv'), '--out-dir', str(tmp_path), '--workers', '1', '--dedup', 'press',
+                   '--similarity', '0.8'])
+    _, titles = TitleIndex(str(tmp_path)).query()
+    assert dict(zip(titles['Press'], titles['Title'])) == dict(zip(raw['Press'], raw['Title']))
+    methods = dict(zip(titles['Press'], titles['Methods']))
+    assert methods['ETToday'] == '' and 'interrogative' in methods['TVBS'] and 'ellipsis' in methods['三立']
+    assert np.array_equal(np.sort(TitleIndex(str(tmp_path)).title_ids), [0, 1, 2])
@@ -0,0 +1,53 @@
+import numpy as np
+import plotly.graph_objects as go
+
+from figure_cache import FigureCache, figure_size
+
+POINTS = 10_000
+
+
+def figure(value):
+    return go.Figure(go.Scatter(y=np.full(POINTS, value, dtype=np.float64)))
+
+
+def test_figure_size_tracks_data():
+    small, large = figure_size(figure(0)), figure_size(go.Figure(go.Scatter(y=np.zeros(10 * POINTS))))
+    assert POINTS * 8 <= small < POINTS * 8 + 1024
+    assert large > 9 * small
+
+
+def test_hits_and_misses():
+    cache = FigureCache(max_mb=1)
+    builds = []
+
+    def build(value):
+        builds.append(value)
+        return figure(value)
+    first = cache.get_or_build('a', lambda: build(1))
+    assert cache.get_or_build('a', lambda: build(2)) is first
+    cache.get_or_build('b', lambda: build(3))
+    assert builds == [1, 3]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_is_evicted():
+    # 上限約可放 3 張圖，加入第 4 張時淘汰最久沒用到的圖
+    cache = FigureCache(max_mb=3.5 * figure_size(figure(0)) / 2**20)
+    for key in 'abc':
+        cache.get_or_build(key, lambda: figure(0))
+    cache.get_or_build('a', lambda: figure(0))
+    cache.get_or_build('d', lambda: figure(0))
+    assert list(cache._figures) == ['c', 'a', 'd']
+    assert cache.total_bytes <= cache.max_bytes
+    misses = cache.misses
+    cache.get_or_build('b', lambda: figure(0))
+    assert cache.misses == misses + 1
+    assert list(cache._figures) == ['a', 'd', 'b']
+
+
+def test_oversized_figure_is_kept_alone():
+    # 單張圖超過上限時仍保留最新的一張
+    cache = FigureCache(max_mb=0.01)
+    cache.get_or_build('a', lambda: figure(0))
+    cache.get_or_build('b', lambda: figure(0))
+    assert list(cache._figures) == ['b']
@@ -0,0 +1,71 @@
+import copy
+
+import numpy as np
+import pytest
+
+from benchmark import synthetic_titles
+from is_clickbait import (CRITERIA_COLUMNS, criteria_flags, criterion_2, criterion_3, criterion_15, is_clickbait, load_rules,
+                          match_criteria, score_titles, use_rules)
+from tests import reference_criteria
+
+# 排除字、量詞與標點的邊界情況
+EDGE_CASES = [
+    '', ' ', '網路', '網站', '網銀', '網友', '網路網友', '驚天', '驚天驚', '驚訝', '才是', '才是才', '人才', '步步驚心',
+    '恐嚇', '驚恐', '恐', '質疑', '疑', '瘋傳', '宣傳', '傳', '唯恐天下不亂', '3個月', '3個', '三個月', '三個', '十大',
+    '3個月5招搞定', '個', '5 招', '三 招', '?!', '!', '？', '？！', '!?!', '⋯⋯', '⋯', '...', '..', '…', '了', '他們',
+    '如何', '該怎麼做', '曝光', '再爆', '怒批', '正妹', '最', 'ABC', '網路?', '驚天了', '原來如此！',
+]
+
+
+def corpus():
+    return EDGE_CASES + next(synthetic_titles(20_000, seed=7))
+
+
+def test_flags_match_reference():
+    for title in corpus():
+        assert criteria_flags(match_criteria(title)) == reference_criteria.criteria_results(title), title
+
+
+def test_verdict_matches_reference():
+    for title in corpus():
+        assert is_clickbait(title) == reference_criteria.is_clickbait(title), title
+
+
+def test_score_titles_matches_reference():
+    titles = corpus()
+    scores = score_titles(titles)
+    expected = np.array([reference_criteria.criteria_results(title) for title in titles], dtype=np.uint8)
+    assert (scores[CRITERIA_COLUMNS].to_numpy() == expected).all()
+    assert scores['IsClickbait'].tolist() == [bool(reference_criteria.is_clickbait(title)) for title in titles]
+
+
+@pytest.mark.parametrize('title, column, expected', [
+    ('網路', 'netizen', 0), ('網友', 'netizen', 1), ('驚天', 'surprise', 0), ('驚', 'surprise', 1),
+    ('才是', 'surprise', 0), ('3個月', 'list', 0), ('5招', 'list', 1), ('?!', 'interrogative', 1),
+    ('?', 'interrogative', 0), ('⋯⋯', 'ellipsis', 1),
+])
+def test_edge_cases(title, column, expected):
+    assert score_titles([title])[column].iloc[0] == expected
+
+
+def test_is_clickbait_is_quiet(capsys):
+    is_clickbait('你竟然不知道？！')
+    assert capsys.readouterr().out == ''
+
+
+@pytest.fixture
+def punctuation_keyword():
+    # 規則檔加入以標點開頭的關鍵字「!!」(criterion 2)，測試結束後換回預設規則
+    rules = copy.deepcopy(load_rules())
+    rules['keyword_criteria']['2'].append('!!')
+    use_rules(rules)
+    yield
+    use_rules(load_rules())
+
+
+@pytest.mark.parametrize('title, marks', [('!!', 2), ('好!!', 2), ('!!!', 3), ('!!？', 3), ('好!!好', 2), ('!', 1)])
+def test_punctuation_keyword_keeps_mark_count(punctuation_keyword, title, marks):
+    # 「!!」是最長的 token 時，標點仍然逐一計數
+    assert criterion_2(title) == int('!!' in title)
+    assert criterion_3(title) == int(marks >= 2)
+    assert criterion_15(title) == 1
@@ -0,0 +1,119 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel_data import COUNT_COLUMNS, PanelCube, PanelDataset, wilson_interval
+from tests.corpus import CATEGORIES, PRESSES
+
+
+def weekly_panel(seed=0, weeks=120):
+    # 假的週 panel：部分 (週, 媒體, 類別) 沒有資料
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2018-01-01', periods=weeks, freq='W-MON')
+    index = pd.MultiIndex.from_product([dates, PRESSES, CATEGORIES], names=['Date', 'Press', 'Category'])
+    df = index.to_frame(index=False)[rng.random(len(index)) < 0.7].reset_index(drop=True)
+    df['Count_News'] = rng.integers(1, 200, len(df))
+    for column in COUNT_COLUMNS[1:]:
+        df[column] = rng.integers(0, df['Count_News'] + 1)
+    for column in ['Press', 'Category']:
+        df[column] = df[column].astype('category')
+    return df
+
+
+def groupby_summary(df, by, start_date, end_date, presses, categories, monthly):
+    # 原本的寫法：篩選後 groupby 加總
+    selected = df
+    if start_date is not None:
+        selected = selected[selected['Date'] >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        selected = selected[selected['Date'] <= pd.Timestamp(end_date)]
+    if presses is not None:
+        selected = selected[selected['Press'].isin(presses)]
+    if categories is not None:
+        selected = selected[selected['Category'].isin(categories)]
+    selected = selected.assign(Press=selected['Press'].astype(str), Category=selected['Category'].astype(str),
+                               MonthYear=selected['Date'].dt.strftime('%Y-%m'))
+    levels = [*by, *(['MonthYear'] if monthly else [])]
+    if not levels:
+        result = selected[COUNT_COLUMNS].sum().to_frame().T
+    else:
+        result = selected.groupby(levels)[COUNT_COLUMNS].sum().reset_index()
+    result = result[result['Count_News'] > 0].reset_index(drop=True)
+    return result.astype({column: np.int64 for column in COUNT_COLUMNS})
+
+
+def random_queries(count, seed=0):
+    rng = random.Random(seed)
+    days = pd.date_range('2017-12-01', '2020-06-30')
+    for _ in range(count):
+        start, end = sorted(rng.sample(list(days), 2))
+        yield (rng.choice([['Press'], ['Category'], ['Press', 'Category'], []]),
+               None if rng.random() < 0.1 else start, None if rng.random() < 0.1 else end,
+               rng.sample(PRESSES, rng.randint(1, len(PRESSES))) if rng.random() < 0.7 else None,
+               rng.sample(CATEGORIES, rng.randint(1, len(CATEGORIES))) if rng.random() < 0.7 else None,
+               rng.random() < 0.5)
+
+
+def test_summarize_matches_groupby():
+    df = weekly_panel()
+    cube = PanelCube(df)
+    for by, start, end, presses, categories, monthly in random_queries(300):
+        result = cube.summarize(by, start, end, presses, categories, monthly)
+        expected = groupby_summary(df, by, start, end, presses, categories, monthly)
+        pd.testing.assert_frame_equal(result.reset_index(drop=True), expected, check_dtype=False)
+        assert (result[COUNT_COLUMNS].dtypes == np.int64).all()
+
+
+def test_first_date():
+    df = weekly_panel()
+    cube = PanelCube(df)
+    for _, start, end, *_ in random_queries(100, seed=1):
+        dates = df['Date']
+        dates = dates[(dates >= (start or dates.min())) & (dates <= (end or dates.max()))]
+        assert cube.first_date(start, end) == (dates.min() if len(dates) else None)
+
+
+def test_three_month_panel_without_dates():
+    df = weekly_panel().drop(columns='Date')
+    cube = PanelCube(df)
+    result = cube.summarize(['Press'])
+    expected = df.assign(Press=df['Press'].astype(str)).groupby('Press')[COUNT_COLUMNS].sum().reset_index()
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('start, end', [('2018-03-05', '2018-09-30'), ('2017-01-01', '2030-01-01'), ('2019-02-02', '2019-02-03')])
+def test_select_date(tmp_path, start, end):
+    path = tmp_path / 'panel.csv'
+    weekly_panel().sample(frac=1, random_state=0).to_csv(path)
+    dataset = PanelDataset(str(path))
+    frame = dataset.frame
+    expected = frame[(frame['Date'] >= pd.Timestamp(start)) & (frame['Date'] <= pd.Timestamp(end))]
+    pd.testing.assert_frame_equal(dataset.select_date(start, end), expected)
+    assert dataset.count_rows(start, end) == len(expected)
+    pd.testing.assert_frame_equal(dataset.select_date(start, end, 100, 250), expected.iloc[100:350])
+
+
+def test_wilson_interval_known_values():
+    # 5/10、0/10 與 Newcombe (1998) 的 81/263
+    lower, upper = wilson_interval([5, 0, 10, 81], [10, 10, 10, 263])
+    np.testing.assert_allclose(lower, [0.2366, 0.0, 0.7225, 0.2553], atol=1e-4)
+    np.testing.assert_allclose(upper, [0.7634, 0.2775, 1.0, 0.3662], atol=1e-4)
+
+
+def test_wilson_interval_no_trials_is_nan():
+    lower, upper = wilson_interval([0, 3], [0, 4])
+    assert np.isnan(lower[0]) and np.isnan(upper[0])
+    assert not np.isnan(lower[1]) and not np.isnan(upper[1])
+
+
+def test_wilson_interval_bounds():
+    rng = np.random.default_rng(0)
+    trials = rng.integers(1, 10**6, 100_000)
+    successes = rng.integers(0, trials + 1)
+    successes[::3], successes[1::3] = 0, trials[1::3]
+    lower, upper = wilson_interval(successes, trials)
+    ratio = successes / trials
+    assert (lower >= 0).all() and (upper <= 1).all()
+    assert (lower <= ratio).all() and (ratio <= upper).all()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from panel_data import COUNT_COLUMNS, PanelCube
+from panel_store import PartitionedDataset, PartitionedPanel, merge_partitions
+from tests.test_panel_data import random_queries, weekly_panel
+
+
+def daily_panel():
+    # 每週的資料散到週內的某一天，讓月份的頭尾常常只有部分在查詢範圍內
+    df = weekly_panel()
+    rng = np.random.default_rng(1)
+    df['Date'] = df['Date'] + pd.to_timedelta(rng.integers(0, 7, len(df)), unit='D')
+    return df.sort_values(['Date', 'Press', 'Category'], kind='stable').reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def panels(tmp_path_factory):
+    df = daily_panel()
+    root = str(tmp_path_factory.mktemp('store'))
+    # 分兩次合併，第二次的資料與第一次落在相同的分割時會加總
+    half = len(df) // 2
+    merge_partitions(df.iloc[:half], root)
+    merge_partitions(df.iloc[half:], root)
+    return df, PanelCube(df), root
+
+
+def test_summarize_matches_cube(panels):
+    _, cube, root = panels
+    store = PartitionedPanel(root)
+    for by, start, end, presses, categories, monthly in random_queries(300, seed=2):
+        expected = cube.summarize(by, start, end, presses, categories, monthly).reset_index(drop=True)
+        result = store.summarize(by, start, end, presses, categories, monthly)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_categorical=False)
+
+
+def test_first_date_matches_cube(panels):
+    _, cube, root = panels
+    store = PartitionedPanel(root)
+    for _, start, end, *_ in random_queries(100, seed=3):
+        assert store.first_date(start, end) == cube.first_date(start, end)
+
+
+@pytest.mark.parametrize('start, end', [('2018-03-05', '2018-09-30'), ('2017-01-01', '2030-01-01'), ('2019-02-02', '2019-02-03')])
+def test_select_date_pages(panels, start, end):
+    # 分頁讀出的列接起來就是整個區間，列數與 count_rows 相同
+    df, _, root = panels
+    dataset = PartitionedDataset(root)
+    full = dataset.select_date(start, end)
+    expected = df[(df['Date'] >= pd.Timestamp(start)) & (df['Date'] <= pd.Timestamp(end))]
+    assert dataset.count_rows(start, end) == len(full) == len(expected)
+    assert full[COUNT_COLUMNS].sum().tolist() == expected[COUNT_COLUMNS].sum().tolist()
+    pages = [dataset.select_date(start, end, offset, 500) for offset in range(0, len(full), 500)]
+    assert all(len(page) == 500 for page in pages[:-1])
+    assert dataset.select_date(start, end, len(full), 500).empty
+    if pages:
+        pd.testing.assert_frame_equal(pd.concat(pages, ignore_index=True), full)
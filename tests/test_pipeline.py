@@ -0,0 +1,90 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import pipeline
+from dedup import STAGED_ROWS_DIR, TITLE_ROWS_DIR
+from pipeline import MANIFEST_FILE, PROCESSED_FILE, THREE_MONTH_FILE, WEEKLY_FILE
+from tests.corpus import raw_corpus, write_corpus
+
+PANEL_FILES = [WEEKLY_FILE, THREE_MONTH_FILE, PROCESSED_FILE]
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    df = raw_corpus(6000, seed=1, unique=4000)
+    split = 4500
+    return (write_corpus(df, tmp_path / 'all.csv'), write_corpus(df[:split], tmp_path / 'a.csv'),
+            write_corpus(df[split:], tmp_path / 'b.csv'))
+
+
+@pytest.mark.parametrize('dedup, similarity', [('none', '1'), ('global', '1'), ('press', '1'), ('press', '0.8')])
+def test_update_matches_build(tmp_path, corpus, dedup, similarity):
+    # build(全部) 與 build(前段) + update(後段) 的 panel CSV 完全相同
+    all_path, a_path, b_path = corpus
+    options = ['--workers', '1', '--chunksize', '1000', '--dedup', dedup, '--similarity', similarity]
+    pipeline.main(['build', all_path, '--out-dir', str(tmp_path / 'full'), *options])
+    pipeline.main(['build', a_path, '--out-dir', str(tmp_path / 'inc'), *options])
+    pipeline.main(['update', b_path, '--out-dir', str(tmp_path / 'inc'), '--workers', '1', '--chunksize', '1000'])
+    for name in PANEL_FILES:
+        assert read_bytes(tmp_path / 'full' / name) == read_bytes(tmp_path / 'inc' / name), name
+
+
+def test_update_same_input_twice_is_skipped(tmp_path, corpus):
+    all_path, a_path, _ = corpus
+    out_dir = str(tmp_path / 'out')
+    pipeline.main(['build', a_path, '--out-dir', out_dir, '--workers', '1', '--dedup', 'none'])
+    before = read_bytes(os.path.join(out_dir, WEEKLY_FILE))
+    pipeline.main(['update', a_path, '--out-dir', out_dir, '--workers', '1'])
+    assert read_bytes(os.path.join(out_dir, WEEKLY_FILE)) == before
+
+
+def test_interrupted_update_is_not_merged_again(tmp_path, corpus, monkeypatch):
+    # 改寫途中中斷時 manifest 留有 in_progress，之後的 update 不會再合併一次
+    _, a_path, b_path = corpus
+    out_dir = str(tmp_path / 'out')
+    pipeline.main(['build', a_path, '--out-dir', out_dir, '--workers', '1', '--dedup', 'none'])
+
+    def crash(*args):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(pipeline, 'write_csv', crash)
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.main(['update', b_path, '--out-dir', out_dir, '--workers', '1'])
+    monkeypatch.undo()
+
+    with open(os.path.join(out_dir, MANIFEST_FILE), encoding='utf-8') as f:
+        assert json.load(f)['in_progress'] == f'update {b_path}'
+    with pytest.raises(SystemExit):
+        pipeline.main(['update', b_path, '--out-dir', out_dir, '--workers', '1'])
+    # 重新 build 後恢復正常
+    pipeline.main(['build', a_path, '--out-dir', out_dir, '--workers', '1', '--dedup', 'none'])
+    pipeline.main(['update', b_path, '--out-dir', out_dir, '--workers', '1'])
+
+
+def test_rewrite_tail_leaves_no_temp_file(tmp_path, corpus):
+    _, a_path, b_path = corpus
+    out_dir = tmp_path / 'out'
+    pipeline.main(['build', a_path, '--out-dir', str(out_dir), '--workers', '1', '--dedup', 'none'])
+    pipeline.main(['update', b_path, '--out-dir', str(out_dir), '--workers', '1'])
+    assert not [name for name in os.listdir(out_dir) if name.endswith('.tmp')]
+    weekly = pd.read_csv(out_dir / WEEKLY_FILE, index_col=0)
+    assert list(weekly.index) == list(range(len(weekly)))
+
+
+def test_title_rows_are_written_per_chunk(tmp_path, corpus):
+    # 計數過的列逐批寫成 part，不在記憶體中累積到 build 結束
+    _, a_path, b_path = corpus
+    out_dir = tmp_path / 'out'
+    pipeline.main(['build', a_path, '--out-dir', str(out_dir), '--workers', '1', '--chunksize', '1000', '--dedup', 'press'])
+    pipeline.main(['update', b_path, '--out-dir', str(out_dir), '--workers', '1', '--chunksize', '1000'])
+    assert not (out_dir / STAGED_ROWS_DIR).exists()
+    assert len(os.listdir(out_dir / TITLE_ROWS_DIR)) == 5 + 2
+    rows = pd.read_parquet(out_dir / TITLE_ROWS_DIR)
+    assert len(rows) == pd.read_csv(out_dir / WEEKLY_FILE, index_col=0)['Count_News'].sum()
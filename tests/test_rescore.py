@@ -0,0 +1,72 @@
+import copy
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import pipeline
+from is_clickbait import load_rules, use_rules
+from panel_store import PartitionedPanel
+from pipeline import PROCESSED_FILE, THREE_MONTH_FILE, WEEKLY_FILE
+from tests.corpus import raw_corpus, write_corpus
+
+PANEL_FILES = [WEEKLY_FILE, THREE_MONTH_FILE, PROCESSED_FILE]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def changed_rules():
+    # 改動關鍵字、排除字、量詞順序與強判斷方法
+    rules = copy.deepcopy(load_rules())
+    rules['version'] = rules.get('version', 0) + 1
+    rules['keyword_criteria']['2'] = [word for word in rules['keyword_criteria']['2'] if word != '讚'] + ['驚爆', '!!']
+    rules['lookahead_criteria']['12']['excluded'].append('網友')
+    rules['list_quantifiers'] = list(reversed(rules['list_quantifiers']))
+    rules['strong_criteria'] = sorted(set(rules['strong_criteria']) | {2})
+    return rules
+
+
+@pytest.fixture(autouse=True)
+def restore_rules():
+    # use_rules 會改變模組的全域狀態，每個測試結束後換回預設規則
+    yield
+    use_rules(load_rules())
+
+
+@pytest.mark.parametrize('dedup', ['global', 'press'])
+def test_rescore_matches_rebuild(tmp_path, dedup):
+    # 舊規則 build + rescore(新規則) 與新規則直接 build 的 panel 完全相同
+    corpus = write_corpus(raw_corpus(5000, seed=3, unique=3000), tmp_path / 'raw.csv')
+    rules_path = tmp_path / 'rules.json'
+    rules = changed_rules()
+    rules_path.write_text(json.dumps(rules, ensure_ascii=False), encoding='utf-8')
+    options = ['--workers', '1', '--chunksize', '1000', '--dedup', dedup]
+
+    pipeline.main(['build', corpus, '--out-dir', str(tmp_path / 'inc'), '--panel-dir', str(tmp_path / 'inc' / 'store'), *options])
+    pipeline.main(['rescore', '--rules', str(rules_path), '--out-dir', str(tmp_path / 'inc')])
+    use_rules(rules)
+    pipeline.main(['build', corpus, '--out-dir', str(tmp_path / 'full'), '--panel-dir', str(tmp_path / 'full' / 'store'), *options])
+
+    for name in PANEL_FILES:
+        assert read_bytes(tmp_path / 'full' / name) == read_bytes(tmp_path / 'inc' / name), name
+    full, inc = PartitionedPanel(str(tmp_path / 'full' / 'store')), PartitionedPanel(str(tmp_path / 'inc' / 'store'))
+    for by in [['Press'], ['Category'], ['Press', 'Category']]:
+        pd.testing.assert_frame_equal(full.summarize(by, monthly=True), inc.summarize(by, monthly=True))
+
+
+def test_list_quantifier_order_ignores_hash_seed():
+    # 量詞依規則檔的順序檢查，結果不能隨 PYTHONHASHSEED 改變
+    code = 'from is_clickbait import criterion_6; print(criterion_6("3個月5招搞定"), criterion_6("5個月3種方法"))'
+    outputs = set()
+    for seed in ['0', '1', '2', '3', '42']:
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        outputs.add(subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+                                   check=True).stdout)
+    assert len(outputs) == 1
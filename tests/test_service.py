@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+
+import service
+from is_clickbait import is_clickbait
+from service import MicroBatcher, handle_connection, handle_request
+
+
+def parse(raw):
+    head, _, body = raw.partition(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1]), json.loads(body)
+
+
+async def call(method, path, body=b''):
+    # 啟動批次處理的 task，呼叫一次 handle_request 後停止
+    batcher = MicroBatcher(max_delay_ms=1)
+    task = asyncio.create_task(batcher.run())
+    try:
+        return parse(await handle_request(batcher, method, path, body))
+    finally:
+        task.cancel()
+
+
+def request(method, path, body=b''):
+    return asyncio.run(call(method, path, body))
+
+
+def test_health():
+    assert request('GET', '/health') == (200, {'status': 'ok', 'batches': 0, 'titles': 0})
+
+
+def test_unknown_path():
+    assert request('GET', '/score')[0] == 404
+    assert request('POST', '/other', b'"x"')[0] == 404
+
+
+def test_single_title():
+    title = '你絕對想不到！這招竟然有效？'
+    status, result = request('POST', '/score', json.dumps(title).encode())
+    assert status == 200
+    assert result['title'] == title and result['is_clickbait'] == is_clickbait(title)
+
+
+def test_title_array():
+    titles = ['柯文哲回應市政府預算案爭議', '網友傻眼！5招教你省電']
+    status, results = request('POST', '/score', json.dumps(titles, ensure_ascii=False).encode())
+    assert status == 200
+    assert [result['title'] for result in results] == titles
+    assert request('POST', '/score', b'[]') == (200, [])
+
+
+@pytest.mark.parametrize('body', [b'not json', b'\xff\xfe', b'{"title": "x"}', b'["x", 1]', b'3'])
+def test_bad_body(body):
+    assert request('POST', '/score', body)[0] == 400
+
+
+@pytest.mark.parametrize('body', [b'"\\ud800"', b'["ok", "a\\udfffb"]'])
+def test_lone_surrogate(body):
+    status, result = request('POST', '/score', body)
+    assert status == 400 and 'surrogate' in result['error']
+
+
+def test_scoring_failure(monkeypatch):
+    def fail(titles):
+        raise RuntimeError('broken rules')
+    monkeypatch.setattr(service, 'score_batch', fail)
+    assert request('POST', '/score', b'"x"') == (500, {'error': 'scoring failed'})
+
+
+async def exchange(raw):
+    # 對真的連線送出原始的 HTTP 請求，讀回所有回應
+    batcher = MicroBatcher(max_delay_ms=1)
+    task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(batcher, reader, writer), '127.0.0.1', 0)
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+        writer.write(raw)
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), 10)
+        writer.close()
+        return data
+    finally:
+        server.close()
+        task.cancel()
+
+
+def post(body, connection='keep-alive'):
+    return (f'POST /score HTTP/1.1\r\nHost: x\r\nConnection: {connection}\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n').encode('ascii') + body
+
+
+def test_connection_replies_to_every_request():
+    # 錯誤的請求也會收到回應，keep-alive 的連線繼續處理下一個請求
+    data = asyncio.run(exchange(post(b'"\\ud800"') + post(b'"ok"', 'close')))
+    assert data.count(b'HTTP/1.1 ') == 2
+    assert data.startswith(b'HTTP/1.1 400 ') and b'HTTP/1.1 200 ' in data
+
+
+@pytest.mark.parametrize('raw', [b'GARBAGE\r\n\r\n', b'POST /score HTTP/1.1\r\nContent-Length: abc\r\n\r\n',
+                                 b'POST /score HTTP/1.1\r\nContent-Length: -5\r\n\r\n'])
+def test_malformed_request(raw):
+    assert asyncio.run(exchange(raw)).startswith(b'HTTP/1.1 400 ')
+
+
+@pytest.mark.parametrize('raw', [b'POST /' + b'x' * 70_000 + b' HTTP/1.1\r\n\r\n',
+                                 b'POST /score HTTP/1.1\r\nX-Long: ' + b'x' * 70_000 + b'\r\n\r\n'])
+def test_oversized_head(raw):
+    assert asyncio.run(exchange(raw)).startswith(b'HTTP/1.1 431 ')
+
+
+async def concurrent_requests(bodies):
+    # 同時送出所有請求，回傳各請求的結果與批次數
+    batcher = MicroBatcher(max_delay_ms=20)
+    task = asyncio.create_task(batcher.run())
+    try:
+        replies = await asyncio.gather(*(handle_request(batcher, 'POST', '/score', body) for body in bodies))
+        return [parse(reply) for reply in replies], batcher.batches
+    finally:
+        task.cancel()
+
+
+def test_concurrent_requests_are_batched():
+    # 同時進來的請求合併成少數幾批，每個請求仍拿到自己的結果、順序不變
+    requests = [[f'第{i}則標題{"！？" * (i % 2)}', f'第{i}則的第二個標題了'] for i in range(40)]
+    bodies = [json.dumps(titles if i % 3 else titles[0], ensure_ascii=False).encode() for i, titles in enumerate(requests)]
+    replies, batches = asyncio.run(concurrent_requests(bodies))
+    assert batches < len(bodies)
+    for i, ((status, result), titles) in enumerate(zip(replies, requests)):
+        assert status == 200
+        results = result if i % 3 else [result]
+        sent = titles if i % 3 else titles[:1]
+        assert [item['title'] for item in results] == sent
+        assert [item['is_clickbait'] for item in results] == [bool(is_clickbait(title)) for title in sent]
@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from dedup import TITLE_ROWS_DIR, TITLES_FILE
+import is_clickbait
+from is_clickbait import CRITERIA_COLUMNS, criterion_bit
+
+# 查詢結果最多列出的標題數
+DEFAULT_LIMIT = 200
+
+
+def title_store_version(out_dir='.'):
+    # 由 pipeline.py (--dedup global/press) 產生的標題資料；沒有時回傳 None
+    titles_path = os.path.join(out_dir, TITLES_FILE)
+    rows_dir = os.path.join(out_dir, TITLE_ROWS_DIR)
+    if not os.path.exists(titles_path) or not os.path.isdir(rows_dir):
+        return None
+    stat = os.stat(titles_path)
+    return f'{stat.st_mtime_ns}-{stat.st_size}-{len(os.listdir(rows_dir))}'
+
+
+def month_range(month):
+    # 'YYYY-MM' -> 該月第一天與最後一天 (panel 的月份以每週星期一所在的月份計算)
+    start = pd.Timestamp(month + '-01')
+    return start, start + pd.offsets.MonthEnd(0)
+
+
+def stable_order(keys):
+    return np.argsort(keys.astype(np.min_scalar_type(keys.max(initial=0))), kind='stable')
+
+
+def sorted_codes(column):
+    # categorical 欄位 -> (排序過的標籤, 每列在標籤中的位置)，不需把整欄轉成字串
+    column = pd.Categorical(column)
+    labels = np.asarray(column.categories.astype(str), dtype=object)
+    order = np.argsort(labels, kind='stable')
+    remap = np.empty(len(labels), dtype=np.int64)
+    remap[order] = np.arange(len(labels))
+    return labels[order], remap[column.codes]
+
+
+class TitleIndex:
+    # 標題層級的 posting list：計數過的每一列依 (Press, Category, 週) 排序，每個 (媒體, 類別) 是一段連續的範圍、範圍內依週排序；
+    # 每個判斷方法 (與 IsClickbait) 存一個排序過的列位置陣列。查詢只需要 searchsorted 與切片，不需掃描 DataFrame
+    def __init__(self, out_dir='.'):
+        titles = pd.read_parquet(os.path.join(out_dir, TITLES_FILE))
+        self.titles = titles['Title'].to_numpy(dtype=object)
+        masks = titles['Mask'].to_numpy(dtype=np.uint16)
+        rows = pd.read_parquet(os.path.join(out_dir, TITLE_ROWS_DIR), columns=['TitleId', 'Date', 'Press', 'Category', 'InWindow'])
+
+        self.presses, press_index = sorted_codes(rows['Press'])
+        self.categories, category_index = sorted_codes(rows['Category'])
+        groups = press_index * len(self.categories) + category_index
+        days = rows['Date'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+        # 依 (媒體, 類別, 週) 排序：先依週、再依 (媒體, 類別) 做兩次 stable sort，key 夠小時 numpy 會用 radix sort
+        order = stable_order(days - days.min(initial=0))
+        order = order[stable_order(groups[order])]
+        # 第 g 個 (媒體, 類別) 的列位置為 [group_starts[g], group_starts[g + 1])
+        self.group_starts = np.searchsorted(groups[order], np.arange(len(self.presses) * len(self.categories) + 1))
+        self.dates = rows['Date'].to_numpy(dtype='datetime64[ns]')[order]
+        self.title_ids = rows['TitleId'].to_numpy(dtype=np.int64)[order]
+        self.in_window = rows['InWindow'].to_numpy(dtype=bool)[order]
+
+        self.row_masks = masks[self.title_ids]
+        # key 為 None 的 posting list 是全部的列，切片都是 view，不會複製
+        position_type = np.int32 if len(self.row_masks) < 1 << 31 else np.int64
+        self.postings = {None: np.arange(len(self.row_masks), dtype=position_type)}
+        hits = np.zeros(len(self.row_masks), dtype=np.uint8)
+        for n, column in enumerate(CRITERIA_COLUMNS, start=1):
+            flag = (self.row_masks & criterion_bit(n)) != 0
+            self.postings[column] = np.flatnonzero(flag).astype(position_type)
+            hits += flag
+        clickbait = ((self.row_masks & is_clickbait.STRONG_MASK) != 0) | (hits >= 2)
+        self.postings['IsClickbait'] = np.flatnonzero(clickbait).astype(position_type)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def months(self):
+        return np.datetime_as_string(np.unique(self.dates.astype('datetime64[M]')), unit='M').tolist()
+
+    def ranges(self, presses=None, categories=None, method=None, start_date=None, end_date=None, three_month=False):
+        # 符合條件的列位置，每個 (媒體, 類別) 一段：先用日期 searchsorted 取出範圍，再從判斷方法的 posting list 切出範圍內的部分。
+        # 每段都依週排序
+        press_index = np.flatnonzero(np.isin(self.presses, list(self.presses if presses is None else presses)))
+        category_index = np.flatnonzero(np.isin(self.categories, list(self.categories if categories is None else categories)))
+        start = None if start_date is None else np.datetime64(pd.Timestamp(start_date), 'ns')
+        end = None if end_date is None else np.datetime64(pd.Timestamp(end_date), 'ns')
+        posting = self.postings[method]
+
+        parts = []
+        for group in (press_index[:, None] * len(self.categories) + category_index).ravel():
+            lo, hi = self.group_starts[group], self.group_starts[group + 1]
+            dates = self.dates[lo:hi]
+            if start is not None:
+                lo = self.group_starts[group] + np.searchsorted(dates, start, 'left')
+            if end is not None:
+                hi = self.group_starts[group] + np.searchsorted(dates, end, 'right')
+            if hi <= lo:
+                continue
+            # 用與 posting list 相同的型別查詢，避免 numpy 把整個陣列轉型
+            a, b = np.searchsorted(posting, np.array([lo, hi], dtype=posting.dtype))
+            part = posting[a:b]
+            if three_month:
+                part = part[self.in_window[part]]
+            parts.append(part)
+        return parts
+
+    def query(self, presses=None, categories=None, method=None, start_date=None, end_date=None, three_month=False,
+              limit=DEFAULT_LIMIT):
+        # 回傳 (符合的標題數, 最新的 limit 則標題)；每段只需取最後 limit 列來挑最新的標題
+        parts = self.ranges(presses, categories, method, start_date, end_date, three_month)
+        total = sum(len(part) for part in parts)
+        positions = np.concatenate([np.empty(0, dtype=np.int64)] + [part[-limit:] for part in parts])
+        if len(positions) > limit:
+            newest = np.argpartition(-self.dates[positions].view(np.int64), limit - 1)[:limit]
+            positions = positions[newest]
+        positions = positions[np.argsort(-self.dates[positions].view(np.int64), kind='stable')]
+
+        groups = np.searchsorted(self.group_starts, positions, 'right') - 1
+        masks = self.row_masks[positions]
+        result = pd.DataFrame({
+            'Date': pd.to_datetime(self.dates[positions]).date,
+            'Press': self.presses[groups // len(self.categories)],
+            'Category': self.categories[groups % len(self.categories)],
+            'Title': self.titles[self.title_ids[positions]],
+            'Methods': [', '.join(column for i, column in enumerate(CRITERIA_COLUMNS[:14]) if mask >> i & 1) for mask in masks],
+        })
+        return total, result